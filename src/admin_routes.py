@@ -3,10 +3,14 @@
 admin router - define routes for admin
 """
 
-from flask import Blueprint, render_template, request, jsonify, abort, make_response
+from flask import Blueprint, render_template, request, jsonify, abort, make_response, current_app, session
 
 import base
 import admin_controller
+from config import envConfig as ecf
+import database as db
+import response_cache
+import sql_profiler
 
 
 # Create Blueprint for admin with url_prefix is "/admin" to redirect route
@@ -16,6 +20,12 @@ admin_bp = Blueprint('admin', __name__,
                      template_folder='templates')
 
 
+def _require_admin(enabled: bool) -> None:
+    """404 unless the report is enabled in config or the session belongs to an admin"""
+    if not enabled and session.get('role') != db.UserRole.ADMIN.value:
+        abort(404)
+
+
 class Dashboard(base.BaseView):
 
     def get(self):
@@ -23,3 +33,51 @@ class Dashboard(base.BaseView):
 
 
 admin_bp.add_url_rule('/dashboard', 'dashboard', Dashboard.as_view('dashboard'))
+
+
+class CacheStats(base.BaseView):
+    """Hit / miss counters of response caches of this worker"""
+
+    def get(self):
+        # cache keys of the site
+        _require_admin(ecf.ADMIN_REPORTS)
+        return jsonify(response_cache.stats())
+
+
+admin_bp.add_url_rule('/cache-stats', 'cache_stats', CacheStats.as_view('cache_stats'))
+
+
+class PoolStats(base.BaseView):
+    """Connection pool counters of this worker (checked_out should go back to 0 between requests)"""
+
+    def get(self):
+        # hosts and names of the databases
+        _require_admin(ecf.ADMIN_REPORTS)
+        return jsonify(db.pool_stats())
+
+
+admin_bp.add_url_rule('/pool-stats', 'pool_stats', PoolStats.as_view('pool_stats'))
+
+
+class SqlReport(base.BaseView):
+    """Statements and DB time per endpoint of this worker, slow queries and N+1 suspects"""
+
+    def get(self):
+        # raw statements of the site
+        _require_admin(ecf.SQL_REPORT)
+        return jsonify(sql_profiler.report())
+
+
+admin_bp.add_url_rule('/sql-report', 'sql_report', SqlReport.as_view('sql_report'))
+
+
+class StartupReport(base.BaseView):
+    """Time spent in each phase of create_app of this worker"""
+
+    def get(self):
+        _require_admin(ecf.ADMIN_REPORTS)
+        report = current_app.extensions.get('startup_report')
+        return jsonify(report.as_dict() if report else {})
+
+
+admin_bp.add_url_rule('/startup-report', 'startup_report', StartupReport.as_view('startup_report'))
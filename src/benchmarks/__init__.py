@@ -0,0 +1,41 @@
+"""
+Benchmarks of News Universe - run from folder src:
+
+    python -m benchmarks.listing_projection
+    python -m benchmarks.json_serialization
+    python -m benchmarks.model_methods
+"""
+import os
+import tempfile
+
+import category_tree
+import database as db
+import model
+import response_cache
+
+
+def open_database(url: str | None = None) -> str:
+    """
+    Point module database to url (default: a new SQLite file) and create tables
+
+    Returns:
+        URL of the database used
+    """
+    if url is None:
+        fd, path = tempfile.mkstemp(prefix='news_bench_', suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{path}'
+    os.environ['DATABASE_URL'] = url
+    if db._engine is not None:
+        db._engine.dispose()
+    db._engine = None
+    db._SessionLocal = None
+    # caches of the process still hold rows of the previous database
+    for cache in category_tree._caches.values():
+        cache.reset()
+    model._creator_totals = model._TotalCache()
+    for cache in response_cache.caches.values():
+        cache.clear()
+    response_cache.invalidations.reset()
+    db.init_db()
+    return url
@@ -0,0 +1,279 @@
+"""
+Benchmark dataset - a seeded database shaped like production
+
+Both sites get articles in a nested category tree, plus users, reading
+history (viewed_news) and comments with replies. Values are skewed the way
+real traffic is:
+    - view counts follow a Zipf law, the top 1% of articles are hot
+    - articles pile up in a few categories, deep ones included
+    - views and comments go mostly to the most viewed articles
+    - article length is log-normal (many short, a few very long)
+
+Rows are written with executemany in batches; ids are assigned here from
+the current max id, so seeding an existing database only adds rows.
+The same seed value gives the same dataset.
+"""
+import datetime
+import itertools
+import math
+import random
+
+from sqlalchemy import func, insert
+
+import database as db
+import excerpts
+import utils
+
+
+BATCH_SIZE = 1000
+PASSWORD = 'benchmark'
+
+WORDS = (
+    'tin tức thời sự kinh tế thế giới hà nội việt nam thị trường chứng khoán '
+    'giáo dục sức khỏe thể thao bóng đá công nghệ dữ liệu chính phủ người dân '
+    'market policy election climate energy research football technology city'
+).split()
+
+# share of articles per status
+STATUSES = (
+    (db.NewsStatus.PUBLISHED, 0.85),
+    (db.NewsStatus.DRAFT, 0.05),
+    (db.NewsStatus.PENDING, 0.04),
+    (db.NewsStatus.HIDDEN, 0.03),
+    (db.NewsStatus.REJECTED, 0.03),
+)
+
+
+def zipf_weights(amount: int, skew: float) -> list[float]:
+    """Weight of rank 1..amount, rank 1 the most popular"""
+    return [1 / (rank ** skew) for rank in range(1, amount + 1)]
+
+
+def _next_id(session, entity) -> int:
+    return (session.query(func.max(entity.id)).scalar() or 0) + 1
+
+
+def _insert(session, entity, rows: list[dict]) -> None:
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.execute(insert(entity), rows[start:start + BATCH_SIZE])
+
+
+def _category_rows(session, entity, prefix: str, roots: int, fanout: int, depth: int) -> list[dict]:
+    """Tree of roots top level categories, fanout children per category down to depth levels"""
+    next_id = _next_id(session, entity)
+    now = datetime.datetime.now()
+    rows = []
+    level_rows = [None]
+    for level in range(1, depth + 1):
+        current = []
+        for parent in level_rows:
+            for i in range(roots if parent is None else fanout):
+                row = {
+                    'id': next_id,
+                    'name': f'{prefix.replace("-", " ").title()} {next_id}',
+                    'slug': f'{prefix}-{next_id}',
+                    'parent_id': parent['id'] if parent else None,
+                    'level': level,
+                    'order_display': i,
+                    'visible': True,
+                    'created_at': now,
+                    'updated_at': now,
+                }
+                next_id += 1
+                current.append(row)
+        rows.extend(current)
+        level_rows = current
+    return rows
+
+
+def _content(rng: random.Random) -> str:
+    words = max(20, int(rng.lognormvariate(6, 0.7)))  # median about 400 words
+    paragraphs = []
+    for start in range(0, words, 80):
+        paragraphs.append('<p>' + ' '.join(rng.choices(WORDS, k=min(80, words - start))) + '</p>')
+    return ''.join(paragraphs)
+
+
+def _article_rows(session, entity, rng: random.Random, amount: int, category_ids: list[int],
+                  user_ids: list[int], skew: float, slug_prefix: str) -> list[dict]:
+    next_id = _next_id(session, entity)
+    # categories in random popularity order, deep ones are popular too
+    popular_categories = rng.sample(category_ids, len(category_ids))
+    category_weights = zipf_weights(len(category_ids), skew)
+    statuses, status_weights = zip(*STATUSES)
+
+    # rank of views of each article, rank 0 the most viewed
+    ranks = list(range(amount))
+    rng.shuffle(ranks)
+    max_views = amount * 50
+    hot_ranks = max(1, amount // 100)
+
+    now = datetime.datetime.now()
+    rows = []
+    for i in range(amount):
+        row_id = next_id + i
+        content = _content(rng)
+        status = rng.choices(statuses, status_weights)[0]
+        created_at = now - datetime.timedelta(minutes=rng.randrange(365 * 24 * 60))
+        rank = ranks[i]
+        row = {
+            'id': row_id,
+            'title': f'{" ".join(rng.choices(WORDS, k=rng.randint(5, 12))).capitalize()} {row_id}',
+            'slug': f'{slug_prefix}-{row_id}',
+            'summary': ' '.join(rng.choices(WORDS, k=30)) if rng.random() < 0.7 else None,
+            'content': content,
+            'thumbnail': f'/static/uploads/{row_id}.jpg',
+            'category_id': rng.choices(popular_categories, category_weights)[0],
+            'created_by': rng.choice(user_ids),
+            'status': status,
+            'is_featured': rng.random() < 0.03,
+            'is_hot': rank < hot_ranks,
+            'is_deleted': rng.random() < 0.02,
+            'view_count': int(max_views / ((rank + 1) ** skew)),
+            'published_at': created_at if status == db.NewsStatus.PUBLISHED else None,
+            'created_at': created_at,
+            'updated_at': created_at,
+            **excerpts.text_stats(content),
+        }
+        rows.append(row)
+    return rows
+
+
+def seed(session, articles: int = 1000, users: int = 100, views: int = 5000, comments: int = 2000,
+         root_categories: int = 6, category_fanout: int = 3, category_depth: int = 3,
+         skew: float = 1.1, seed: int = 42) -> dict:
+    """
+    Insert a skewed dataset, articles on each site
+
+    Returns:
+        sample values of the dataset (ids, slugs, names) for benchmark calls
+    """
+    rng = random.Random(seed)
+
+    # users: 5% editors (authors), the rest readers
+    password_hash = utils.hash_password(PASSWORD)
+    next_user = _next_id(session, db.User)
+    now = datetime.datetime.now()
+    user_rows = [
+        {
+            'id': next_user + i,
+            'username': f'bench_user_{next_user + i}',
+            'email': f'bench_user_{next_user + i}@example.com',
+            'password_hash': password_hash,
+            'full_name': f'Bench User {next_user + i}',
+            'role': db.UserRole.EDITOR if i < max(1, users // 20) else db.UserRole.USER,
+            'is_active': rng.random() > 0.01,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for i in range(max(1, users))
+    ]
+    _insert(session, db.User, user_rows)
+    editor_ids = [row['id'] for row in user_rows if row['role'] == db.UserRole.EDITOR]
+    user_ids = [row['id'] for row in user_rows]
+
+    sites = {}
+    for site, category_entity, news_entity, prefix in (
+        ('vn', db.Category, db.News, 'danh-muc'),
+        ('en', db.CategoryInternational, db.NewsInternational, 'section'),
+    ):
+        category_rows = _category_rows(session, category_entity, prefix,
+                                       root_categories, category_fanout, category_depth)
+        _insert(session, category_entity, category_rows)
+        category_ids = [row['id'] for row in category_rows]
+        news_rows = _article_rows(session, news_entity, rng, articles, category_ids, editor_ids, skew,
+                                  'bai-viet' if site == 'vn' else 'article')
+        _insert(session, news_entity, news_rows)
+        sites[site] = (category_rows, news_rows)
+
+    # views and comments go to articles by their popularity
+    by_views = sorted(((site, row) for site, (_, news_rows) in sites.items() for row in news_rows),
+                      key=lambda item: item[1]['view_count'], reverse=True)
+    weights = list(itertools.accumulate(zipf_weights(len(by_views), skew)))
+
+    def pick_news() -> tuple[str, dict]:
+        return rng.choices(by_views, cum_weights=weights)[0]
+
+    def target(site: str, row: dict) -> dict:
+        if site == 'vn':
+            return {'news_id': row['id'], 'news_international_id': None, 'site': site}
+        return {'news_id': None, 'news_international_id': row['id'], 'site': site}
+
+    next_view = _next_id(session, db.ViewedNews)
+    view_rows = []
+    for i in range(views):
+        view_rows.append({
+            'id': next_view + i,
+            'user_id': rng.choice(user_ids),
+            'viewed_at': now - datetime.timedelta(minutes=rng.randrange(30 * 24 * 60)),
+            **target(*pick_news()),
+        })
+    _insert(session, db.ViewedNews, view_rows)
+
+    # 20% of comments answer an earlier comment of the same article
+    next_comment = _next_id(session, db.Comment)
+    comment_rows = []
+    comments_of = {}
+    for i in range(comments):
+        site, news = pick_news()
+        earlier = comments_of.setdefault((site, news['id']), [])
+        comment_id = next_comment + i
+        comment_rows.append({
+            'id': comment_id,
+            'user_id': rng.choice(user_ids),
+            'content': ' '.join(rng.choices(WORDS, k=rng.randint(3, 40))),
+            'parent_id': rng.choice(earlier) if earlier and rng.random() < 0.2 else None,
+            'is_active': True,
+            'created_at': now - datetime.timedelta(minutes=rng.randrange(30 * 24 * 60)),
+            'updated_at': now,
+            **target(site, news),
+        })
+        earlier.append(comment_id)
+    _insert(session, db.Comment, comment_rows)
+    session.commit()
+
+    return _sample(sites, user_rows, editor_ids)
+
+
+def _sample(sites: dict, user_rows: list[dict], editor_ids: list[int]) -> dict:
+    reader = next(row for row in reversed(user_rows) if row['is_active'])
+    sample = {'editor_id': editor_ids[0], 'username': reader['username'],
+              'email': reader['email'], 'password': PASSWORD}
+    for site, (category_rows, news_rows) in sites.items():
+        published = [row for row in news_rows
+                     if row['status'] == db.NewsStatus.PUBLISHED and not row['is_deleted']]
+        published.sort(key=lambda row: (row['created_at'], row['id']), reverse=True)
+        hot = max(published, key=lambda row: row['view_count'])
+        roots = [row for row in category_rows if row['parent_id'] is None]
+        deepest = max(category_rows, key=lambda row: row['level'])
+        # category holding most articles
+        counts = {}
+        for row in news_rows:
+            counts[row['category_id']] = counts.get(row['category_id'], 0) + 1
+        busiest = max(counts, key=counts.get)
+        middle = published[len(published) // 2]
+        sample[site] = {
+            'news_id': hot['id'],
+            'news_slug': hot['slug'],
+            'news_ids': [row['id'] for row in published[:20]],
+            'pending_ids': [row['id'] for row in news_rows if row['status'] == db.NewsStatus.PENDING],
+            'cursor': utils.encode_cursor(middle['created_at'], middle['id']),
+            'category_id': busiest,
+            'category_slug': next(row['slug'] for row in category_rows if row['id'] == busiest),
+            'root_category_id': roots[0]['id'],
+            'deep_category_id': deepest['id'],
+            'root_category_ids': [row['id'] for row in roots],
+            'keyword': published[0]['title'].split()[0],
+        }
+    return sample
+
+
+def volumes(articles: int) -> dict:
+    """Default volumes of the other tables for an amount of articles per site"""
+    return {
+        'articles': articles,
+        'users': max(10, articles // 10),
+        'views': articles * 5,
+        'comments': articles * 2,
+        'category_depth': max(2, min(4, int(math.log10(max(articles, 10))))),
+    }
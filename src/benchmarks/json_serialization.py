@@ -0,0 +1,81 @@
+"""
+JSON serialization benchmark - encoding time of a page of news cards
+
+Compare the old path of the API views (utils._news_to_dict +
+json.JSONEncoder) with serializer.page (orjson, bytes). Articles are
+transient News objects, no database is needed.
+
+    python -m benchmarks.json_serialization [--sizes 10 100 1000] [--repeat 5]
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+import database as db
+import serializer
+import utils
+
+
+def make_items(amount: int) -> list:
+    category = db.Category(id=1, name='Thế giới', slug='the-gioi')
+    start = datetime.datetime(2025, 1, 1)
+    return [
+        db.News(
+            id=i,
+            title=f'Tin tức số {i}: "Hà Nội" hôm nay',
+            slug=f'tin-tuc-so-{i}',
+            summary='Tóm tắt nội dung bài viết. ' * 6,
+            thumbnail=f'/static/uploads/{i}.jpg',
+            category=category,
+            view_count=i * 7,
+            is_featured=i % 3 == 0,
+            is_hot=i % 5 == 0,
+            published_at=start + datetime.timedelta(minutes=i) if i % 2 else None,
+            created_at=start + datetime.timedelta(minutes=i),
+        )
+        for i in range(amount)
+    ]
+
+
+def old_path(items) -> str:
+    data = {
+        'success': True,
+        'data': [utils._news_to_dict(news) for news in items],
+        'next_cursor': None,
+    }
+    return json.JSONEncoder().encode(data)
+
+
+def fast_path(items) -> bytes:
+    return serializer.page(items, None)
+
+
+def measure(fn, items, repeat: int) -> float:
+    """Best time of one call in microseconds"""
+    number = max(1, 2000 // len(items))
+    return min(timeit.repeat(lambda: fn(items), number=number, repeat=repeat)) / number * 1e6
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    paths = [('old (dict + JSONEncoder)', old_path), ('serializer', fast_path)]
+
+    print(f'{"path":<26} {"items":>6} {"time us":>10} {"speedup":>8}')
+    for size in args.sizes:
+        items = make_items(size)
+        expected = json.loads(old_path(items))
+        baseline = None
+        for name, fn in paths:
+            assert json.loads(fn(items)) == expected, f'{name} output differs'
+            elapsed = measure(fn, items, args.repeat)
+            baseline = baseline or elapsed
+            print(f'{name:<26} {size:>6} {elapsed:>10,.0f} {baseline / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
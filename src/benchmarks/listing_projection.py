@@ -0,0 +1,125 @@
+"""
+Listing projection benchmark - bytes fetched and peak memory of one 100-item page
+
+Compare the full entity query (before: every column incl. content, images,
+SEO, tags_string) with the card projection used by the list methods of
+NewsModel (after: model.CARD_COLUMNS only).
+
+    python -m benchmarks.listing_projection [--articles 500] [--content-kb 20]
+"""
+import argparse
+import datetime
+import gc
+import tracemalloc
+
+from sqlalchemy import desc
+
+import database as db
+import model
+from index_advisor import capture_statements
+from benchmarks import open_database
+
+
+PAGE_SIZE = 100
+
+
+def seed(session, articles: int, content_kb: int) -> None:
+    user = db.User(username='bench', email='bench@example.com', password_hash='-', role=db.UserRole.EDITOR)
+    category = db.Category(name='Bench', slug='bench')
+    session.add_all([user, category])
+    session.flush()
+
+    content = '<p>' + ('Lorem ipsum dolor sit amet, tin tức hôm nay. ' * (content_kb * 1024 // 46)) + '</p>'
+    start = datetime.datetime.now() - datetime.timedelta(minutes=articles)
+    for i in range(articles):
+        session.add(db.News(
+            title=f'Bench article {i}',
+            slug=f'bench-article-{i}',
+            summary=f'Summary of bench article {i}',
+            content=content,
+            thumbnail=f'/static/uploads/{i}.jpg',
+            images='["/static/uploads/a.jpg", "/static/uploads/b.jpg"]',
+            meta_title=f'Bench article {i}',
+            meta_description='SEO description ' * 20,
+            meta_keywords='bench, news',
+            tags_string='bench,news,' * 10,
+            category_id=category.id,
+            created_by=user.id,
+            status=db.NewsStatus.PUBLISHED,
+            created_at=start + datetime.timedelta(minutes=i),
+        ))
+    session.commit()
+
+
+def _size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, str)):
+        return len(value.encode('utf-8') if isinstance(value, str) else value)
+    return len(str(value))
+
+
+def measure(name: str, run) -> dict:
+    """Bytes of every row value fetched and peak Python memory of hydrating the page"""
+    engine = db.create_engine_instance()
+
+    session = db.get_session()
+    statements = capture_statements(engine, lambda: run(session))
+    session.close()
+
+    fetched = 0
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            for row in connection.exec_driver_sql(statement, parameters):
+                fetched += sum(_size(value) for value in row)
+
+    session = db.get_session()
+    gc.collect()
+    tracemalloc.start()
+    items = run(session)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.close()
+
+    return {'name': name, 'rows': len(items), 'bytes_fetched': fetched, 'peak_memory': peak}
+
+
+def full_entity_page(session):
+    """Query of get_published before the card projection"""
+    return (
+        session.query(db.News)
+        .filter(db.News.status == db.NewsStatus.PUBLISHED, db.News.is_deleted == False)
+        .order_by(desc(db.News.created_at), desc(db.News.id))
+        .limit(PAGE_SIZE)
+        .all()
+    )
+
+
+def card_page(session):
+    return model.NewsModel(session).get_published(limit=PAGE_SIZE)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=500)
+    parser.add_argument('--content-kb', type=int, default=20, help='size of content of an article')
+    parser.add_argument('--database-url', default=None, help='default: a new SQLite file')
+    args = parser.parse_args(argv)
+
+    open_database(args.database_url)
+    session = db.get_session()
+    seed(session, args.articles, args.content_kb)
+    session.close()
+
+    before = measure('full entity', full_entity_page)
+    after = measure('card columns', card_page)
+
+    print(f'{"query":<14} {"rows":>5} {"bytes fetched":>15} {"peak memory":>13}')
+    for result in (before, after):
+        print(f'{result["name"]:<14} {result["rows"]:>5} {result["bytes_fetched"]:>15,} {result["peak_memory"]:>13,}')
+    print(f'bytes fetched: {before["bytes_fetched"] / max(after["bytes_fetched"], 1):.1f}x less, '
+          f'peak memory: {before["peak_memory"] / max(after["peak_memory"], 1):.1f}x less')
+
+
+if __name__ == '__main__':
+    main()
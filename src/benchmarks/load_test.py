@@ -0,0 +1,379 @@
+"""
+Load test - replay a traffic mix on the routes of client_bp / admin_bp
+
+Concurrent workers (threads) send requests picked from a weighted mix of
+scenarios for --duration seconds, either through the Flask test client
+(in process) or over HTTP to a WSGI server started on localhost. Articles
+and categories are picked with the popularity skew of the dataset, so
+caches see realistic hit rates. Reports throughput, latency percentiles,
+status codes and error rate (5xx and failed requests) per scenario.
+
+Before measuring, each scenario of the mix is sent once and must succeed
+(2xx, or a redirect for login): a broken route would only measure error
+pages. The run fails (exit status 1) when the error rate of the recorded
+traffic is above --max-error-rate.
+
+Runs offline: by default a new SQLite database is seeded with
+benchmarks.dataset; --database-url uses an already seeded database.
+
+    python -m benchmarks.load_test [--mode client|server] [--workers 8]
+                                   [--duration 30] [--articles 2000]
+                                   [--mix home=20,category=25,article=45,search=10]
+                                   [--max-error-rate 0.01] [--output results.json]
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+
+from sqlalchemy.engine import make_url
+
+import database as db
+from benchmarks import dataset, open_database
+
+
+# login is not in the default mix: pages of a signed in user link to the
+# profile / logout routes, which client_bp does not have yet
+DEFAULT_MIX = 'home=20,category=25,article=45,search=10'
+
+
+def load_targets(session, limit: int = 1000) -> dict:
+    """Slugs, keywords and users the scenarios pick from, most popular first"""
+    news_slugs = [
+        slug for slug, in session.query(db.News.slug)
+        .filter(db.News.status == db.NewsStatus.PUBLISHED, db.News.is_deleted == False)
+        .order_by(db.News.view_count.desc()).limit(limit)
+    ]
+    category_slugs = [slug for slug, in session.query(db.Category.slug).order_by(db.Category.id)]
+    usernames = [
+        username for username, in session.query(db.User.username)
+        .filter(db.User.role == db.UserRole.USER, db.User.is_active == True).limit(limit)
+    ]
+    if not news_slugs or not category_slugs:
+        raise SystemExit('Database has no published article, seed it first (--articles)')
+    return {'news': news_slugs, 'categories': category_slugs, 'users': usernames}
+
+
+class Scenarios:
+    """Request (method, path, form) of each scenario for a worker"""
+
+    def __init__(self, targets: dict, rng: random.Random, skew: float = 1.1):
+        self.targets = targets
+        self.rng = rng
+        self._news_weights = list(itertools.accumulate(dataset.zipf_weights(len(targets['news']), skew)))
+        self._category_weights = list(itertools.accumulate(dataset.zipf_weights(len(targets['categories']), skew)))
+
+    def home(self):
+        return 'GET', '/', None
+
+    def category(self):
+        slug = self.rng.choices(self.targets['categories'], cum_weights=self._category_weights)[0]
+        return 'GET', f'/category/{slug}', None
+
+    def article(self):
+        slug = self.rng.choices(self.targets['news'], cum_weights=self._news_weights)[0]
+        return 'GET', f'/news/{slug}', None
+
+    def search(self):
+        keyword = ' '.join(self.rng.sample(dataset.WORDS, self.rng.randint(1, 2)))
+        return 'GET', '/search?' + urllib.parse.urlencode({'q': keyword}), None
+
+    def login(self):
+        username = self.rng.choice(self.targets['users']) if self.targets['users'] else 'nobody'
+        # one login out of five uses a wrong password
+        password = dataset.PASSWORD if self.rng.random() < 0.8 else 'wrong-password'
+        return 'POST', '/signin', {'username': username, 'password': password}
+
+    def latest(self):
+        return 'GET', '/latest-news', None
+
+    def hot(self):
+        return 'GET', '/hot-news', None
+
+    def feed(self):
+        return 'GET', '/home-feed', None
+
+
+SCENARIOS = [name for name in vars(Scenarios) if not name.startswith('_')]
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f'Unknown scenario {name!r}, choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class TestClientTransport:
+    """Requests through the Flask test client, one client (cookie jar) per worker"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method: str, path: str, form: dict | None) -> tuple[int, int]:
+        response = self.client.open(path, method=method, data=form)
+        size = len(response.get_data())
+        response.close()
+        return response.status_code, size
+
+
+class HttpTransport:
+    """Requests over HTTP to host:port, new connection when the server closes it"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.connection = None
+
+    def send(self, method: str, path: str, form: dict | None) -> tuple[int, int]:
+        body, headers = None, {}
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.connection.close()
+                    self.connection = None
+                return response.status, len(data)
+            except (http.client.HTTPException, ConnectionError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+
+def start_server(app) -> tuple:
+    """Threaded WSGI server of app on a free localhost port, (server, port)"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server, server.server_port
+
+
+class Recorder:
+    """Latencies and status codes of the requests of all workers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.failures = {}
+        self.bytes = 0
+
+    def add(self, scenario: str, seconds: float, status: int | None, size: int = 0) -> None:
+        with self._lock:
+            self.latencies.setdefault(scenario, []).append(seconds * 1000)
+            if status is None:
+                self.failures[scenario] = self.failures.get(scenario, 0) + 1
+            else:
+                codes = self.statuses.setdefault(scenario, {})
+                codes[status] = codes.get(status, 0) + 1
+            self.bytes += size
+
+
+def worker(transport, scenarios: Scenarios, mix: dict, recorder: Recorder, deadline: float,
+           record_after: float) -> None:
+    names, weights = list(mix), list(mix.values())
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            return
+        scenario = scenarios.rng.choices(names, weights)[0]
+        method, path, form = getattr(scenarios, scenario)()
+        started = time.perf_counter()
+        try:
+            status, size = transport.send(method, path, form)
+        except Exception:
+            status, size = None, 0
+        elapsed = time.perf_counter() - started
+        # requests of the warmup are not recorded
+        if started >= record_after:
+            recorder.add(scenario, elapsed, status, size)
+
+
+def smoke_check(transport, scenarios: Scenarios, mix: dict) -> dict[str, int | None]:
+    """Status of one request of each scenario of mix whose response is not a success"""
+    failed = {}
+    for scenario in mix:
+        method, path, form = getattr(scenarios, scenario)()
+        try:
+            status, _ = transport.send(method, path, form)
+        except Exception:
+            status = None
+        if status is None or not 200 <= status < 400:
+            failed[scenario] = status
+    return failed
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    scenarios = {}
+    all_latencies = []
+    total_errors = 0
+    for scenario, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        all_latencies.extend(latencies)
+        codes = recorder.statuses.get(scenario, {})
+        errors = recorder.failures.get(scenario, 0) + sum(count for code, count in codes.items() if code >= 500)
+        total_errors += errors
+        scenarios[scenario] = _latency_stats(latencies, elapsed) | {
+            'errors': errors,
+            'error_rate': round(errors / len(latencies), 4),
+            'status': {str(code): count for code, count in sorted(codes.items())},
+            'failed': recorder.failures.get(scenario, 0),
+        }
+    all_latencies.sort()
+    total = _latency_stats(all_latencies, elapsed) | {
+        'errors': total_errors,
+        'error_rate': round(total_errors / len(all_latencies), 4) if all_latencies else 0.0,
+        'bytes': recorder.bytes,
+    }
+    return {'total': total, 'scenarios': scenarios}
+
+
+def _latency_stats(latencies: list[float], elapsed: float) -> dict:
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def print_report(summary: dict) -> None:
+    print(f'{"scenario":<10} {"requests":>9} {"rps":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+          f'{"errors":>7}  status', file=sys.stderr)
+    rows = list(summary['scenarios'].items()) + [('TOTAL', summary['total'])]
+    for name, stats in rows:
+        status = ' '.join(f'{code}:{count}' for code, count in stats.get('status', {}).items())
+        print(f'{name:<10} {stats["requests"]:>9} {stats["throughput_rps"]:>9.1f} {stats["p50_ms"]:>9.2f} '
+              f'{stats["p95_ms"]:>9.2f} {stats["p99_ms"]:>9.2f} {stats["error_rate"]:>7.1%}  {status}',
+              file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['client', 'server'], default='client',
+                        help='Flask test client in process, or HTTP to a local WSGI server')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent workers (threads)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of recorded traffic')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds of traffic before recording')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'scenario=weight list, scenarios: {", ".join(SCENARIOS)}')
+    parser.add_argument('--articles', type=int, default=2000, help='articles per site of the seeded database')
+    parser.add_argument('--database-url', default=None, help='use this seeded database instead of seeding one')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random traffic')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='fail when the error rate of the recorded traffic is above it')
+    parser.add_argument('--output', default=None, help='JSON file of the results')
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        open_database()
+        session = db.get_session()
+        dataset.seed(session, **dataset.volumes(args.articles))
+        session.close()
+
+    # imported after DATABASE_URL is set: the app reads it when created
+    import main as app_main
+
+    app = app_main.create_app()
+    session = db.get_session()
+    targets = load_targets(session)
+    session.close()
+
+    server = None
+    if args.mode == 'server':
+        server, port = start_server(app)
+
+        def transport():
+            return HttpTransport('127.0.0.1', port)
+    else:
+        def transport():
+            return TestClientTransport(app)
+
+    failed = smoke_check(transport(), Scenarios(targets, random.Random(args.seed)), mix)
+    if failed:
+        if server is not None:
+            server.shutdown()
+        details = ', '.join(f'{name} ({status or "no response"})' for name, status in failed.items())
+        print(f'Scenarios failing before the load test: {details}', file=sys.stderr)
+        return 1
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    record_after = started + args.warmup
+    deadline = record_after + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(transport(), Scenarios(targets, random.Random(args.seed + i)), mix, recorder, deadline, record_after),
+            name=f'load-test-{i}', daemon=True,
+        )
+        for i in range(args.workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - record_after
+    if server is not None:
+        server.shutdown()
+
+    summary = summarize(recorder, elapsed)
+    print_report(summary)
+    results = {
+        'mode': args.mode,
+        'workers': args.workers,
+        'duration': round(elapsed, 3),
+        'mix': mix,
+        'database': make_url(db.get_database_url()).get_backend_name(),
+        **summary,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    error_rate = summary['total']['error_rate']
+    if error_rate > args.max_error_rate:
+        print(f'ERROR: error rate {error_rate:.1%} is above {args.max_error_rate:.1%}, '
+              f'latencies measure failing requests', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Model methods benchmark - time of every public method of the model classes
+
+For each size a new database is seeded with benchmarks.dataset (size
+articles per site, other tables scaled from it), then each method is run
+--repeat times on a new session and its min / median / p95 time and the
+amount of statements of one call are recorded. Results are written as JSON;
+with --baseline the medians are compared with an earlier run and methods
+slower than --tolerance times the baseline fail the run.
+
+    python -m benchmarks.model_methods [--sizes 1000 10000] [--repeat 20]
+                                       [--output results.json]
+                                       [--baseline old.json --tolerance 1.5]
+"""
+import argparse
+import datetime
+import inspect
+import json
+import platform
+import statistics
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy import event
+
+import database as db
+import model
+import search
+from benchmarks import dataset, open_database
+
+
+MODEL_CLASSES = {
+    'NewsModel': model.NewsModel,
+    'CategoryModel': model.CategoryModel,
+    'UserModel': model.UserModel,
+    'InternationalNewsModel': model.InternationalNewsModel,
+    'InternationalCategoryModel': model.InternationalCategoryModel,
+}
+
+
+def _article_rows(x: dict, i: int, amount: int = 10) -> list[dict]:
+    return [
+        {'title': f'Benchmark import {i} {n}', 'content': '<p>Imported article</p>',
+         'category_id': x['category_id'], 'created_by': x['editor_id']}
+        for n in range(amount)
+    ]
+
+
+def _news_cases(name: str, cls, site: str) -> list:
+    """(name, function(session, sample, i)) of the methods shared by both news models"""
+    def case(method, fn):
+        return (f'{name}.{method}', lambda s, x, i: fn(cls(s), {**x[site], 'editor_id': x['editor_id']}, i))
+
+    cases = [
+        case('get_by_id', lambda m, x, i: m.get_by_id(x['news_id'])),
+        case('get_by_slug', lambda m, x, i: m.get_by_slug(x['news_slug'])),
+        case('get_version', lambda m, x, i: m.get_version(x['news_slug'])),
+        case('get_listing_version', lambda m, x, i: m.get_listing_version([x['category_id']])),
+        case('get_all', lambda m, x, i: m.get_all(limit=20, offset=200)),
+        case('get_published', lambda m, x, i: m.get_published(limit=20, offset=200)),
+        case('get_published(cursor)', lambda m, x, i: m.get_published(limit=20, cursor=x['cursor'])),
+        case('get_by_category', lambda m, x, i: m.get_by_category(x['category_id'], limit=20)),
+        case('get_by_categories', lambda m, x, i: m.get_by_categories(x['root_category_ids'], limit=20)),
+        case('get_versions_by_categories', lambda m, x, i: m.get_versions_by_categories(x['root_category_ids'], limit=20)),
+        case('get_cards', lambda m, x, i: m.get_cards(x['news_ids'])),
+        case('get_featured', lambda m, x, i: m.get_featured(limit=10)),
+        case('get_hot', lambda m, x, i: m.get_hot(limit=10)),
+        case('get_top_by_groups', lambda m, x, i: m.get_top_by_groups({c: [c] for c in x['root_category_ids']})),
+        case('search', lambda m, x, i: m.search(x['keyword'], limit=20)),
+        case('search_page', lambda m, x, i: m.search_page(x['keyword'], limit=20)),
+        case('update', lambda m, x, i: m.update(x['news_id'], summary=f'Benchmark summary {i}')),
+        case('approve', lambda m, x, i: m.approve(x['pending_ids'][i % len(x['pending_ids'])], x['editor_id'])),
+        case('reject', lambda m, x, i: m.reject(x['pending_ids'][-1 - i % len(x['pending_ids'])], x['editor_id'], 'benchmark')),
+        case('increment_view', lambda m, x, i: m.increment_view(x['news_id'])),
+        case('bulk_create', lambda m, x, i: list(m.bulk_create(_article_rows(x, i)))),
+    ]
+    if cls is model.NewsModel:
+        cases += [
+            case('get_by_creator', lambda m, x, i: m.get_by_creator(x['editor_id'], limit=20)),
+            case('create', lambda m, x, i: m.create(f'Benchmark article {i}', '<p>Benchmark</p>',
+                                                    x['category_id'], x['editor_id'])),
+            case('delete', lambda m, x, i: m.delete(x['news_ids'][i % len(x['news_ids'])])),
+        ]
+    return cases
+
+
+def _category_cases(name: str, cls, site: str) -> list:
+    def case(method, fn):
+        return (f'{name}.{method}', lambda s, x, i: fn(cls(s), x[site], i))
+
+    return [
+        case('get_all', lambda m, x, i: m.get_all()),
+        case('get_by_id', lambda m, x, i: m.get_by_id(x['category_id'])),
+        case('get_by_slug', lambda m, x, i: m.get_by_slug(x['category_slug'])),
+        case('get_tree', lambda m, x, i: m.get_tree()),
+        case('get_tree_version', lambda m, x, i: m.get_tree_version()),
+        case('get_descendant_ids', lambda m, x, i: m.get_descendant_ids(x['root_category_id'])),
+        case('get_breadcrumbs', lambda m, x, i: m.get_breadcrumbs(x['deep_category_id'])),
+        case('get_menu', lambda m, x, i: m.get_menu()),
+        case('create', lambda m, x, i: m.create(f'Benchmark {site} {i}', f'benchmark-{site}-{i}',
+                                                parent_id=x['root_category_id'])),
+        case('update', lambda m, x, i: m.update(x['category_id'], description=f'Benchmark {i}')),
+    ]
+
+
+def _user_cases() -> list:
+    def case(method, fn):
+        return (f'UserModel.{method}', lambda s, x, i: fn(model.UserModel(s), x, i))
+
+    return [
+        case('get_by_id', lambda m, x, i: m.get_by_id(x['editor_id'])),
+        case('get_by_username', lambda m, x, i: m.get_by_username(x['username'])),
+        case('get_by_email', lambda m, x, i: m.get_by_email(x['email'])),
+        case('is_locked_user', lambda m, x, i: m.is_locked_user(x['username'])),
+        case('authenticate', lambda m, x, i: m.authenticate(x['username'], x['password'])),
+        case('create', lambda m, x, i: m.create(f'benchmark_{i}', f'benchmark_{i}@example.com', 'benchmark')),
+    ]
+
+
+# reads first: writes change the rows read by later cases
+CASES = (
+    _news_cases('NewsModel', model.NewsModel, 'vn')
+    + _news_cases('InternationalNewsModel', model.InternationalNewsModel, 'en')
+    + _category_cases('CategoryModel', model.CategoryModel, 'vn')
+    + _category_cases('InternationalCategoryModel', model.InternationalCategoryModel, 'en')
+    + _user_cases()
+)
+WRITES = ('.create', '.update', '.approve', '.reject', '.delete', '.bulk_create', '.increment_view')
+
+
+def uncovered_methods() -> list[str]:
+    """Public methods of the model classes without a case"""
+    covered = {name.split('(')[0] for name, _ in CASES}
+    missing = []
+    for class_name, cls in MODEL_CLASSES.items():
+        for method, _ in inspect.getmembers(cls, inspect.isfunction):
+            if not method.startswith('_') and f'{class_name}.{method}' not in covered:
+                missing.append(f'{class_name}.{method}')
+    return missing
+
+
+def _ordered_cases() -> list:
+    return sorted(CASES, key=lambda case: case[0].endswith(WRITES))
+
+
+def run_case(run, sample: dict, repeat: int) -> dict:
+    engine = db.create_engine_instance()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    times = []
+    for i in range(repeat + 1):
+        session = db.get_session()
+        try:
+            if i == 1:
+                event.listen(engine, 'before_cursor_execute', count)
+            started = time.perf_counter()
+            run(session, sample, i)
+            elapsed = time.perf_counter() - started
+        finally:
+            if i == 1:
+                event.remove(engine, 'before_cursor_execute', count)
+            session.close()
+        # first call warms caches of SQLAlchemy (compiled statements)
+        if i:
+            times.append(elapsed * 1000)
+
+    times.sort()
+    return {
+        'queries': len(statements),
+        'min_ms': round(times[0], 4),
+        'median_ms': round(statistics.median(times), 4),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+        'mean_ms': round(statistics.fmean(times), 4),
+    }
+
+
+def run_size(articles: int, repeat: int, database_url: str | None) -> dict:
+    url = open_database(database_url)
+    volumes = dataset.volumes(articles)
+    session = db.get_session()
+    started = time.perf_counter()
+    sample = dataset.seed(session, **volumes)
+    seed_seconds = time.perf_counter() - started
+    # index of the new rows before timing, searches use the LIKE query until it is built
+    service = search.get_service()
+    if service is not None:
+        for kind in search.KINDS:
+            service.build(session, kind)
+    session.close()
+
+    methods = {}
+    for name, run in _ordered_cases():
+        methods[name] = run_case(run, sample, repeat)
+        print(f'  {articles:>7} {name:<52} {methods[name]["median_ms"]:>10.3f} ms '
+              f'{methods[name]["queries"]:>3} queries', file=sys.stderr)
+    return {
+        'size': articles,
+        'database': sqlalchemy.engine.make_url(url).get_backend_name(),
+        'volumes': volumes,
+        'seed_seconds': round(seed_seconds, 3),
+        'methods': methods,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Methods whose median grew more than tolerance times the baseline of the same size"""
+    old_runs = {run['size']: run['methods'] for run in baseline.get('runs', [])}
+    regressions = []
+    for run in results['runs']:
+        old = old_runs.get(run['size'], {})
+        for name, stats in run['methods'].items():
+            before = old.get(name)
+            if before and before['median_ms'] > 0 and stats['median_ms'] > before['median_ms'] * tolerance:
+                regressions.append(f'{name} @ {run["size"]}: {before["median_ms"]:.3f} -> '
+                                   f'{stats["median_ms"]:.3f} ms ({stats["median_ms"] / before["median_ms"]:.1f}x)')
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='articles per site')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default=None, help='JSON file of results (default: stdout)')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown of median failing the run')
+    parser.add_argument('--database-url', default=None,
+                        help='empty database to seed, one size only (default: a new SQLite file per size)')
+    args = parser.parse_args(argv)
+    if args.database_url and len(args.sizes) > 1:
+        parser.error('--database-url takes one size only')
+
+    uncovered = uncovered_methods()
+    if uncovered:
+        print(f'methods without benchmark: {", ".join(uncovered)}', file=sys.stderr)
+
+    results = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'repeat': args.repeat,
+        'uncovered': uncovered,
+        'runs': [run_size(size, args.repeat, args.database_url) for size in args.sizes],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Category tree - in-memory tree of visible categories for both sites
+
+Descendants, ancestors (breadcrumbs) and menu order are precomputed when the
+tree is built, so lookups never touch the database. Every write of a
+category bumps a version stamp stored in table settings; each worker checks
+the stamp at most every CATEGORY_TREE_CHECK_INTERVAL seconds and rebuilds
+its tree when the stamp changed.
+"""
+import threading
+import time
+import uuid
+
+from config import envConfig as ecf
+import database as db
+
+
+class CategoryNode:
+    """Light copy of a category row, safe to share between sessions"""
+
+    __slots__ = ('id', 'name', 'slug', 'icon', 'description', 'parent_id', 'order_display', 'level')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, getattr(row, name))
+
+    def __repr__(self):
+        return f'<CategoryNode {self.id} {self.slug}>'
+
+
+class CategoryTree:
+    """Immutable tree, O(1) lookup of children / descendants / ancestors"""
+
+    def __init__(self, rows):
+        self.nodes = {row.id: CategoryNode(row) for row in rows}
+        self.by_slug = {node.slug: node for node in self.nodes.values()}
+
+        children = {node_id: [] for node_id in self.nodes}
+        roots = []
+        for node in self.nodes.values():
+            if node.parent_id is None:
+                roots.append(node)
+            elif node.parent_id in children:
+                children[node.parent_id].append(node)
+
+        def order(nodes):
+            return tuple(sorted(nodes, key=lambda n: (n.order_display or 0, n.id)))
+
+        self._roots = order(roots)
+        self._children = {node_id: order(nodes) for node_id, nodes in children.items()}
+        self._descendants = {}
+        self._ancestors = {}
+        for root in self._roots:
+            self._walk(root, ())
+
+    def _walk(self, node, ancestors):
+        """Fill ancestors / descendants of node and its sub tree (iterative, safe with cycles)"""
+        stack = [(node, ancestors, False)]
+        while stack:
+            current, path, done = stack.pop()
+            if done:
+                ids = []
+                for child in self._children[current.id]:
+                    ids.append(child.id)
+                    ids.extend(self._descendants.get(child.id, ()))
+                self._descendants[current.id] = tuple(ids)
+                continue
+            if current.id in self._ancestors:
+                continue
+            self._ancestors[current.id] = path
+            stack.append((current, path, True))
+            for child in reversed(self._children[current.id]):
+                stack.append((child, path + (current,), False))
+
+    def get(self, category_id: int) -> CategoryNode | None:
+        return self.nodes.get(category_id)
+
+    def get_by_slug(self, slug: str) -> CategoryNode | None:
+        return self.by_slug.get(slug)
+
+    def roots(self) -> tuple:
+        """Top level categories ordered by order_display"""
+        return self._roots
+
+    def children(self, category_id: int) -> tuple:
+        """Direct children ordered by order_display"""
+        return self._children.get(category_id, ())
+
+    def descendant_ids(self, category_id: int) -> list[int]:
+        """Id of all child categories (all level)"""
+        return list(self._descendants.get(category_id, ()))
+
+    def ancestors(self, category_id: int) -> list[CategoryNode]:
+        """Parents of category, top level first"""
+        return list(self._ancestors.get(category_id, ()))
+
+    def breadcrumbs(self, category_id: int) -> list[CategoryNode]:
+        """Ancestors and the category itself"""
+        node = self.nodes.get(category_id)
+        return self.ancestors(category_id) + [node] if node else []
+
+    def menu(self) -> list[tuple[CategoryNode, tuple]]:
+        """[(top level category, children)] in display order"""
+        return [(root, self.children(root.id)) for root in self._roots]
+
+
+class TreeCache:
+    """Cached CategoryTree of one table, versioned through table settings"""
+
+    def __init__(self, entity, version_key: str, check_interval: float = 5):
+        self.entity = entity
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tree = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _read_version(self, session):
+        return session.query(db.Setting.value).filter(db.Setting.key == self.version_key).scalar()
+
+    def get(self, session) -> CategoryTree:
+        with self._lock:
+            now = time.monotonic()
+            if self._tree is not None and now - self._checked_at < self.check_interval:
+                return self._tree
+
+            version = self._read_version(session)
+            if self._tree is None or version != self._version:
+                rows = session.query(self.entity).filter(self.entity.visible == True).all()
+                self._tree = CategoryTree(rows)
+                self._version = version
+            self._checked_at = now
+            return self._tree
+
+    def reset(self) -> None:
+        """Drop the local tree, next get() rebuilds it"""
+        with self._lock:
+            self._tree = None
+            self._version = None
+
+    def version(self, session):
+        """Version stamp of the tree returned by get()"""
+        self.get(session)
+        return self._version
+
+    def invalidate(self, session) -> None:
+        """Bump version stamp (all workers rebuild) and drop the local tree"""
+        setting = session.query(db.Setting).filter(db.Setting.key == self.version_key).first()
+        if setting is None:
+            setting = db.Setting(key=self.version_key, category='cache',
+                                 description='Version stamp of cached category tree')
+            session.add(setting)
+        setting.value = uuid.uuid4().hex
+        session.commit()
+        with self._lock:
+            self._tree = None
+
+
+_caches = {
+    'vn': TreeCache(db.Category, 'category_tree_version', ecf.CATEGORY_TREE_CHECK_INTERVAL),
+    'en': TreeCache(db.CategoryInternational, 'category_international_tree_version', ecf.CATEGORY_TREE_CHECK_INTERVAL),
+}
+
+
+def get_tree(session, site: str = 'vn') -> CategoryTree:
+    """Category tree of site ('vn': categories, 'en': categories_international)"""
+    return _caches[site].get(session)
+
+
+def get_version(session, site: str = 'vn'):
+    """Version stamp of category tree of site (None until the first category write)"""
+    return _caches[site].version(session)
+
+
+def invalidate(session, site: str = 'vn') -> None:
+    _caches[site].invalidate(session)
@@ -4,13 +4,14 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy import or_
 from typing import Optional
-from functools import wraps
+from functools import cached_property, wraps
 import pytz
 import os
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 import database as db
 import model
+import request_session
 
 
 class Controller():
@@ -19,13 +20,34 @@ class Controller():
     
     def __init__(self):
         """Khởi tạo controller"""
-        self.db_session = db.get_session()
-        self.news_model = model.NewsModel(self.db_session)
-        self.category_model = model.CategoryModel(self.db_session)
-        self.user_model = model.UserModel(self.db_session)
-        
-        self.int_news_model = model.InternationalNewsModel(self.db_session)
-        self.int_category_model = model.InternationalCategoryModel(self.db_session)
+        # views are (Controller, BaseView): keep BaseView.__init__ (session['site'] used by template filters)
+        super().__init__()
+
+    # session and models are created on first use, the session is shared by
+    # the whole request and closed at its end (request_session)
+    @cached_property
+    def db_session(self):
+        return request_session.get_session()
+
+    @cached_property
+    def news_model(self):
+        return model.NewsModel(self.db_session)
+
+    @cached_property
+    def category_model(self):
+        return model.CategoryModel(self.db_session)
+
+    @cached_property
+    def user_model(self):
+        return model.UserModel(self.db_session)
+
+    @cached_property
+    def int_news_model(self):
+        return model.InternationalNewsModel(self.db_session)
+
+    @cached_property
+    def int_category_model(self):
+        return model.InternationalCategoryModel(self.db_session)
 
     def checkLogin(self):
         """
@@ -41,10 +63,10 @@ class Controller():
         if self.user_model.is_locked_user(username):
             if site == 'en':
                 flash('Account has been locked. Please contact administrator', 'error')
-                return redirect(url_for('client.en_user_login'))
+                return redirect(url_for('client.login'))
             else:
                 flash('Tài khoản đã bị khóa. Vui lòng liên hệ quản trị viên', 'error')
-                return redirect(url_for('client.user_login'))
+                return redirect(url_for('client.login'))
         
         user = self.user_model.authenticate(username, password)
         
@@ -61,11 +83,11 @@ class Controller():
                 session.permanent = False
 
             flash('Đăng nhập thành công', 'success')
-            return redirect(url_for('client.index'))
+            return redirect(url_for('client.home0'))
         else:
             print('Tên đăng nhập hoặc mật khẩu không đúng')
             flash('Tên đăng nhập hoặc mật khẩu không đúng', 'error')
-            return redirect(url_for('client.user_login'))
+            return redirect(url_for('client.login'))
 
 
     def register(self):
@@ -130,10 +152,12 @@ class Controller():
                 )
                 
                 flash('Đăng ký thành công! Vui lòng đăng nhập', 'success')
-                return redirect(url_for('client.user_login'))
+                return redirect(url_for('client.login'))
             except Exception as e:
                 flash('Có lỗi xảy ra khi đăng ký. Vui lòng thử lại', 'error')
 
+        return redirect(url_for('client.register'))
+
     def forgot_password(self):
         """
         Trang quên mật khẩu - Yêu cầu reset
@@ -182,4 +206,29 @@ class Controller():
             # Luôn hiển thị thông báo thành công (bảo mật)
             success_msg = 'Nếu email tồn tại trong hệ thống, chúng tôi đã gửi link đặt lại mật khẩu đến email của bạn.' if site == 'vn' else 'If the email exists in our system, we have sent a password reset link to your email.'
             flash(success_msg, 'success')
-            return redirect(url_for('client.user_login', site=site))
+            return redirect(url_for('client.login', site=site))
+
+        return redirect(url_for('client.forgot_password'))
+
+    def home_feed(self, site: str, limit: int = 10, per_category: int = 4) -> dict:
+        """
+        Data of home page: featured, hot, latest and newest news of every
+        top level category (with its child categories), 4 queries in total
+
+        Returns:
+            {'featured': [...], 'hot': [...], 'latest': [...], 'categories': [(category, [...])]}
+        """
+        news_model = self.int_news_model if site == 'en' else self.news_model
+        category_model = self.int_category_model if site == 'en' else self.category_model
+
+        tree = category_model.get_tree()
+        roots = tree.roots()
+        groups = {root.id: [root.id] + tree.descendant_ids(root.id) for root in roots}
+        top = news_model.get_top_by_groups(groups, per_group=per_category)
+
+        return {
+            'featured': news_model.get_featured(limit=limit),
+            'hot': news_model.get_hot(limit=limit),
+            'latest': news_model.get_published(limit=limit),
+            'categories': [(root, top[root.id]) for root in roots],
+        }
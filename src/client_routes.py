@@ -4,10 +4,16 @@ client router - define routes for client
 """
 
 from flask import Blueprint, render_template, request, jsonify, abort, make_response, session
+from markupsafe import Markup
+from types import SimpleNamespace
 
 import base
 import client_controller
+import conditional
 import json
+import response_cache
+import serializer
+import utils
 
 
 # Create Blueprint for client with url_prefix is empty to redirect route
@@ -19,6 +25,75 @@ client_bp = Blueprint('client', __name__,
 
 controller = client_controller.Controller
 
+MAX_PAGE_LIMIT = 50
+
+# rendered pages: view counts and "x minutes ago" are not in their version,
+# and their body depends on the session (language)
+PAGE_VALIDATORS = {'weak': True, 'vary': ('Cookie',)}
+
+
+def _page_args():
+    """Read limit / offset / cursor of list endpoints from query string"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_PAGE_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    cursor = request.args.get('cursor') or None
+    return limit, offset, cursor
+
+
+def _page_response(items, limit, site, tags):
+    """Encode a page of news with the cursor of the next page, tag the cache entry with its articles"""
+    tags.extend(response_cache.news_tags(site, items))
+    return serializer.page(items, utils.next_cursor(items, limit))
+
+
+def _news_body(news_model, site, news_id, updated_at):
+    """
+    Rendered body of an article (breadcrumb, content, author) from fragment cache,
+    the article is loaded only on a miss
+
+    Returns:
+        (body html, light copy of the article for the rest of the page) or None if not found
+    """
+    def render():
+        news = news_model.get_by_id(news_id)
+        if news is None:
+            return None
+        summary = SimpleNamespace(
+            id=news.id,
+            title=news.title,
+            slug=news.slug,
+            category=SimpleNamespace(name=news.category.name, slug=news.category.slug),
+        )
+        return render_template('client/partials/news_body.html', news=news, site=site), summary
+    
+    key = response_cache.fragment_key('news_body', site, news_id, updated_at)
+    return response_cache.fragments.get_or_set(key, render)
+
+
+def _news_cards(news_model, site, versions):
+    """Rendered cards of [(id, updated_at)] from fragment cache, only the missing articles are loaded"""
+    keys = [response_cache.fragment_key('news_card', site, news_id, updated_at) for news_id, updated_at in versions]
+    cards = [response_cache.fragments.get(key) for key in keys]
+    
+    missing = [news_id for (news_id, _), card in zip(versions, cards) if card is None]
+    if missing:
+        loaded = {news.id: news for news in news_model.get_cards(missing)}
+        for position, (news_id, _) in enumerate(versions):
+            news = loaded.get(news_id) if cards[position] is None else None
+            if news is not None:
+                cards[position] = render_template('client/partials/news_card.html', news=news, site=site)
+                response_cache.fragments.set(keys[position], cards[position])
+    
+    return [Markup(card) for card in cards if card is not None]
+
+
+def _invalid_cursor():
+    data = {
+        'success': False,
+        'message': 'Invalid cursor',
+    }
+    return serializer.json_response(serializer.dumps(data), 400)
+
 
 class Home(base.BaseView):
     
@@ -33,114 +108,237 @@ class Home(base.BaseView):
         return render_template('client/home.html', **values)
 
 
-class Search(base.BaseView):
+class Search(controller, base.BaseView):
+    
+    PAGE_SIZE = 20
     
     def get(self):
         
         site = request.args.get('site', 'vn')
+        keyword = request.args.get('q', '').strip()
+        page = max(request.args.get('page', 1, type=int), 1)
+        
+        news_list, total = [], 0
+        if keyword:
+            news_model = self.int_news_model if site == 'en' else self.news_model
+            news_list, total = news_model.search_page(
+                keyword, limit=self.PAGE_SIZE, offset=(page - 1) * self.PAGE_SIZE
+            )
         
         values = {
             'title': 'News - Page News' if site == 'en' else 'News - Trang Tin Tức',
-            'site': site
+            'site': site,
+            'keyword': keyword,
+            'news_list': news_list,
+            'total': total,
+            'page': page,
+            'page_size': self.PAGE_SIZE,
         }
         return render_template('client/search.html', **values)
 
 
-class Category(base.BaseView):
+class Category(controller, base.BaseView):
+    
+    PAGE_SIZE = 20
     
     def get(self, category_slug):
         
         site = request.args.get('site', 'vn')
-        
-        values = {
-            'title': 'News - Page News' if site == 'en' else 'News - Trang Tin Tức',
-            'site': site,
-            'category': category_slug
-        }
-        return render_template('client/category.html', **values)
-
-
-class Categories(base.BaseView):
+        page = max(request.args.get('page', 1, type=int), 1)
+        
+        category_model = self.int_category_model if site == 'en' else self.category_model
+        news_model = self.int_news_model if site == 'en' else self.news_model
+        
+        # version of the page from the cached tree and one aggregate query
+        category = category_model.get_tree().get_by_slug(category_slug)
+        if category is None:
+            abort(404)
+        category_ids = [category.id] + category_model.get_descendant_ids(category.id)
+        count, last_modified = news_model.get_listing_version(category_ids)
+        # language of the reader formats dates of the page (session['site'])
+        etag = conditional.make_etag('category', site, session.get('site'), category_slug, page,
+                                     category_model.get_tree_version(), count, last_modified)
+        
+        def render():
+            versions = news_model.get_versions_by_categories(
+                category_ids, limit=self.PAGE_SIZE, offset=(page - 1) * self.PAGE_SIZE
+            )
+            values = {
+                'title': 'News - Page News' if site == 'en' else 'News - Trang Tin Tức',
+                'site': site,
+                'category': category,
+                'news_list': _news_cards(news_model, site, versions),
+                'page': page,
+            }
+            return render_template('client/category.html', **values)
+        
+        return conditional.conditional_response(etag, last_modified, render, **PAGE_VALIDATORS)
+
+
+class Categories(controller, base.BaseView):
     
     def get(self):
+        """
+        Without slug: list categories of site
+        With slug: list news of category (and its child categories) by page
+        """
         
         site = request.args.get('site', 'vn')
-        limit = request.args.get('limit', 10)
-        offset = request.args.get('offset', 10)
+        tags = [response_cache.categories_tag(site)]
+        return response_cache.cached_json(site, lambda entry_tags: self.build(site, entry_tags), tags)
+    
+    def build(self, site, tags):
         
-        data = {
-            'success': True,
-            'data': [],
-        }
+        slug = request.args.get('slug')
         
-        jsondata = json.JSONEncoder().encode(data)
+        category_model = self.int_category_model if site == 'en' else self.category_model
+        news_model = self.int_news_model if site == 'en' else self.news_model
         
-        return jsondata
+        if not slug:
+            return serializer.obj(success=serializer.TRUE, data=serializer.category_list(category_model.get_all()))
+        
+        category = category_model.get_by_slug(slug)
+        if category is None:
+            abort(404)
+        
+        limit, offset, cursor = _page_args()
+        category_ids = [category.id] + category_model.get_descendant_ids(category.id)
+        try:
+            items = news_model.get_by_categories(category_ids, limit=limit, offset=offset, cursor=cursor)
+        except ValueError:
+            return _invalid_cursor()
+        
+        tags.extend(response_cache.category_tag(site, category_id) for category_id in category_ids)
+        return _page_response(items, limit, site, tags)
 
 
-class NewsDetail(base.BaseView):
+class NewsDetail(controller, base.BaseView):
     
     def get(self, news_slug):
         
         site = request.args.get('site', 'vn')
         
-        values = {
-            'title': 'News - Page News' if site == 'en' else 'News - Trang Tin Tức',
-            'site': site,
-        }
-        return render_template('client/news_detail.html', **values)
+        # (id, updated_at) only, the article is loaded when its body is not in the fragment cache
+        news_model = self.int_news_model if site == 'en' else self.news_model
+        version = news_model.get_version(news_slug)
+        if version is None:
+            abort(404)
+        news_id, updated_at = version
+        etag = conditional.make_etag('news', site, session.get('site'), news_id, updated_at)
+        
+        def render():
+            fragment = _news_body(news_model, site, news_id, updated_at)
+            if fragment is None:
+                abort(404)
+            news_body, news = fragment
+            # buffered, written in batch by view_counter (a 304 revalidation is not counted)
+            news_model.increment_view(news_id)
+            values = {
+                'title': 'News - Page News' if site == 'en' else 'News - Trang Tin Tức',
+                'site': site,
+                'news': news,
+                'news_body': Markup(news_body),
+            }
+            return render_template('client/news_detail.html', **values)
+        
+        return conditional.conditional_response(etag, updated_at, render, **PAGE_VALIDATORS)
+
+
+class LatestNews(controller, base.BaseView):
+    
+    def get(self):
+        
+        site = request.args.get('site', 'vn')
+        tags = [response_cache.listing_tag(site, 'latest')]
+        return response_cache.cached_json(site, lambda entry_tags: self.build(site, entry_tags), tags)
+    
+    def build(self, site, tags):
+        
+        limit, offset, cursor = _page_args()
+        
+        news_model = self.int_news_model if site == 'en' else self.news_model
+        try:
+            items = news_model.get_published(limit=limit, offset=offset, cursor=cursor)
+        except ValueError:
+            return _invalid_cursor()
+        
+        return _page_response(items, limit, site, tags)
 
 
-class LatestNews(base.BaseView):
+class FeaturedNews(controller, base.BaseView):
     
     def get(self):
         
         site = request.args.get('site', 'vn')
-        limit = request.args.get('limit', 10)
-        offset = request.args.get('offset', 10)
+        tags = [response_cache.listing_tag(site, 'featured')]
+        return response_cache.cached_json(site, lambda entry_tags: self.build(site, entry_tags), tags)
+    
+    def build(self, site, tags):
         
-        data = {
-            'success': True,
-            'data': [],
-        }
+        limit, offset, cursor = _page_args()
         
-        jsondata = json.JSONEncoder().encode(data)
+        news_model = self.int_news_model if site == 'en' else self.news_model
+        try:
+            items = news_model.get_featured(limit=limit, offset=offset, cursor=cursor)
+        except ValueError:
+            return _invalid_cursor()
         
-        return jsondata
+        return _page_response(items, limit, site, tags)
 
 
-class FeaturedNews(base.BaseView):
+class HotNews(controller, base.BaseView):
     
     def get(self):
         
         site = request.args.get('site', 'vn')
-        limit = request.args.get('limit', 10)
-        offset = request.args.get('offset', 10)
+        tags = [response_cache.listing_tag(site, 'hot')]
+        return response_cache.cached_json(site, lambda entry_tags: self.build(site, entry_tags), tags)
+    
+    def build(self, site, tags):
         
-        data = {
-            'success': True,
-            'data': [],
-        }
+        limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_PAGE_LIMIT)
         
-        jsondata = json.JSONEncoder().encode(data)
+        news_model = self.int_news_model if site == 'en' else self.news_model
+        items = news_model.get_hot(limit=limit)
+        tags.extend(response_cache.news_tags(site, items))
         
-        return jsondata
+        return serializer.obj(success=serializer.TRUE, data=serializer.news_list(items))
 
 
-class HotNews(base.BaseView):
+class HomeFeed(controller, base.BaseView):
     
     def get(self):
+        """Featured, hot, latest and top news per category of home page in one response"""
         
         site = request.args.get('site', 'vn')
+        # any published article is in latest, a write of one drops the feed
+        tags = [response_cache.listing_tag(site, name) for name in ('latest', 'featured', 'hot')]
+        tags.append(response_cache.categories_tag(site))
+        return response_cache.cached_json(site, lambda entry_tags: self.build(site, entry_tags), tags)
+    
+    def build(self, site, tags):
         
-        data = {
-            'success': True,
-            'data': [],
-        }
+        limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_PAGE_LIMIT)
+        per_category = min(max(request.args.get('per_category', 4, type=int), 1), MAX_PAGE_LIMIT)
+        
+        feed = self.home_feed(site, limit=limit, per_category=per_category)
+        for name in ('featured', 'hot', 'latest'):
+            tags.extend(response_cache.news_tags(site, feed[name]))
+        for _, items in feed['categories']:
+            tags.extend(response_cache.news_tags(site, items))
         
-        jsondata = json.JSONEncoder().encode(data)
+        data = serializer.obj(
+            featured=serializer.news_list(feed['featured']),
+            hot=serializer.news_list(feed['hot']),
+            latest=serializer.news_list(feed['latest']),
+            latest_next_cursor=serializer.dumps(utils.next_cursor(feed['latest'], limit)),
+            categories=serializer.array([
+                serializer.obj(category=serializer.category(category), news=serializer.news_list(items))
+                for category, items in feed['categories']
+            ]),
+        )
         
-        return jsondata
+        return serializer.obj(success=serializer.TRUE, data=data)
 
 
 class Login(controller, base.BaseView):
@@ -162,7 +360,7 @@ class Login(controller, base.BaseView):
         return render_template('client/login.html', **values)
     
     def post(self):
-        self.checkLogin()
+        return self.checkLogin()
 
 
 class Register(controller, base.BaseView):
@@ -184,7 +382,7 @@ class Register(controller, base.BaseView):
         return render_template('client/register.html', **values)
     
     def post(self):
-        self.register()
+        return self.register()
 
 
 class ForgotPassword(controller, base.BaseView):
@@ -206,7 +404,7 @@ class ForgotPassword(controller, base.BaseView):
         return render_template('client/forgot_password.html', **values)
     
     def post(self):
-        self.forgot_password()
+        return self.forgot_password()
 
 
 class Introducing(base.BaseView):
@@ -274,6 +472,7 @@ client_bp.add_url_rule('/news/<news_slug>', 'news', NewsDetail.as_view('news'))
 client_bp.add_url_rule('/latest-news', 'latestnews', LatestNews.as_view('latestnews'))
 client_bp.add_url_rule('/featured-news', 'featurednews', FeaturedNews.as_view('featurednews'))
 client_bp.add_url_rule('/hot-news', 'hotnews', HotNews.as_view('hotnews'))
+client_bp.add_url_rule('/home-feed', 'homefeed', HomeFeed.as_view('homefeed'))
 client_bp.add_url_rule('/signin', 'login', Login.as_view('login'))
 client_bp.add_url_rule('/signup', 'register', Register.as_view('register'))
 client_bp.add_url_rule('/forgot_password', 'forgot_password', ForgotPassword.as_view('forgot_password'))
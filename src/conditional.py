@@ -0,0 +1,86 @@
+"""
+Conditional GET - ETag / Last-Modified validators and 304 responses
+
+Views compute a cheap version of what they would render (id and updated_at
+of an article, count and max updated_at of a listing, hash of a cached JSON
+body) and call conditional_response(); when the validators sent by the
+client still match, a 304 is returned without rendering the body.
+
+A hash of the body is a strong ETag. Rendered pages get a weak one
+(W/"..."): their version leaves out view counts and "x minutes ago" texts,
+so two bodies of one version are equivalent, not byte identical.
+"""
+import datetime
+import hashlib
+
+from flask import make_response, request
+
+
+def make_etag(*parts) -> str:
+    """ETag value (unquoted) of the version parts of a response (values or an encoded body)"""
+    data = b'\x1f'.join(
+        part if isinstance(part, bytes) else ('' if part is None else str(part)).encode('utf-8')
+        for part in parts
+    )
+    return hashlib.sha1(data).hexdigest()
+
+
+def _to_utc(last_modified: datetime.datetime | None) -> datetime.datetime | None:
+    """Naive datetime of database (local time) to UTC, seconds precision of HTTP dates"""
+    if last_modified is None:
+        return None
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.astimezone()
+    return last_modified.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def is_not_modified(etag: str | None, last_modified: datetime.datetime | None = None) -> bool:
+    """True if validators of the request match (If-None-Match has precedence over If-Modified-Since)"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return etag is not None and request.if_none_match.contains_weak(etag)
+    last_modified = _to_utc(last_modified)
+    if_modified_since = request.if_modified_since
+    return last_modified is not None and if_modified_since is not None and last_modified <= if_modified_since
+
+
+def set_validators(response, etag: str | None, last_modified: datetime.datetime | None = None,
+                   weak: bool = False, vary: tuple = ()):
+    """
+    Add ETag / Last-Modified to response, clients must revalidate before reuse
+
+    Args:
+        weak: send W/"etag" (body equivalent, not byte identical, for the same etag)
+        vary: request headers the body depends on besides the URL (e.g. Cookie)
+    """
+    if etag is not None:
+        response.set_etag(etag, weak=weak)
+    for header in vary:
+        response.vary.add(header)
+    last_modified = _to_utc(last_modified)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag: str | None, last_modified: datetime.datetime | None = None,
+                 weak: bool = False, vary: tuple = ()):
+    return set_validators(make_response('', 304), etag, last_modified, weak, vary)
+
+
+def conditional_response(etag: str | None, last_modified: datetime.datetime | None, render,
+                         weak: bool = False, vary: tuple = ()):
+    """
+    304 if the client has the current version, else the response of render()
+
+    Args:
+        etag: make_etag() of the version of the resource
+        last_modified: datetime of last change of the resource
+        render: function returning the body (or a response), only called on 200
+        weak, vary: see set_validators
+    """
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified, weak, vary)
+    return set_validators(make_response(render()), etag, last_modified, weak, vary)
@@ -1,8 +1,18 @@
 
 
 from datetime import timedelta
+import hashlib
 import os
 import secrets;
+import tempfile
+
+
+def _runtime_dir(name: str) -> str:
+    """Folder in temp of state shared by the workers of this deploy only (user and install path in the name)"""
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    deploy = hashlib.sha1(os.path.dirname(os.path.abspath(__file__)).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'news_universe_{name}-{user}-{deploy}')
+
 
 class envConfig():
 
@@ -33,6 +43,70 @@ class envConfig():
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or MAIL_USERNAME
     MAIL_SUBJECT_PREFIX = os.environ.get('MAIL_SUBJECT_PREFIX') or '[News] '
 
+    # Skip CREATE TABLE / ALTER at startup when the schema version stamped in settings
+    # matches the models (one SELECT); run `python -c "import database; database.init_db(False)"` on deploy
+    DB_SKIP_DDL = os.environ.get('DB_SKIP_DDL', 'False').lower() in ['true', 'on', '1']
+
+    # Card queries raise on a lazy load (N+1 query) instead of running it, on in tests
+    DB_STRICT_LOADING = os.environ.get('DB_STRICT_LOADING', 'False').lower() in ['true', 'on', '1']
+
+    # Connection pool of each worker process (size it from /admin/pool-stats)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 20)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 3600)  # seconds
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)  # seconds to wait for a free connection
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'False').lower() in ['true', 'on', '1']
+    DB_POOL_USE_LIFO = os.environ.get('DB_POOL_USE_LIFO', 'False').lower() in ['true', 'on', '1']
+
+    # Read replicas (comma separated URLs), SELECTs of model methods go to them round-robin
+    DATABASE_REPLICA_URLS = [url.strip() for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+    DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL') or 30)  # seconds between health checks
+    DB_REPLICA_RETRY = float(os.environ.get('DB_REPLICA_RETRY') or 30)  # seconds a failed replica is skipped
+    DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS') or 5)  # reads of a client stay on primary after it wrote
+
+    # Search configuration: 'memory' (in-process inverted index) or 'database' (LIKE query)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'memory'
+    SEARCH_REFRESH_INTERVAL = int(os.environ.get('SEARCH_REFRESH_INTERVAL') or 30)  # seconds
+
+    # View counter: increments are buffered in process and flushed in batch
+    VIEW_COUNTER_FLUSH_INTERVAL = float(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL') or 10)  # seconds
+    VIEW_COUNTER_STATE_DIR = os.environ.get('VIEW_COUNTER_STATE_DIR') or _runtime_dir('views')
+
+    # Category tree cache: seconds between two checks of the version stamp
+    CATEGORY_TREE_CHECK_INTERVAL = float(os.environ.get('CATEGORY_TREE_CHECK_INTERVAL') or 5)
+
+    # Response cache of public JSON endpoints
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL') or 30)  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES') or 1000)
+    # expired responses still served this long while one request rebuilds them
+    RESPONSE_CACHE_STALE_TTL = float(os.environ.get('RESPONSE_CACHE_STALE_TTL') or 60)
+    # seconds between two reads of the invalidations written by other workers
+    RESPONSE_CACHE_CHECK_INTERVAL = float(os.environ.get('RESPONSE_CACHE_CHECK_INTERVAL') or 2)
+
+    # Rendered HTML fragments (article body, cards), keyed by id + updated_at so
+    # an edit never serves an old fragment; the TTL bounds view counts and "x minutes ago"
+    FRAGMENT_CACHE_TTL = float(os.environ.get('FRAGMENT_CACHE_TTL') or 60)
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES') or 5000)
+
+    # Single flight: one request per key rebuilds a missing value, threads and processes of the host wait for it;
+    # the folder is created private (0700), results are shared between processes as signed JSON
+    SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR') or _runtime_dir('flight')
+    SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT') or 10)
+
+    # Request metrics (/metrics), each worker process writes its counters in METRICS_DIR
+    METRICS_DIR = os.environ.get('METRICS_DIR') or _runtime_dir('metrics')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 5)  # seconds
+
+    # SQL profiler: queries and DB time per request, slow query log, N+1 suspects (/admin/sql-report)
+    SQL_PROFILER = os.environ.get('SQL_PROFILER', 'False').lower() in ['true', 'on', '1']
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS') or 100)
+    # same statement shape executed this many times in one request is reported as N+1
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD') or 5)
+    # /admin/sql-report lists raw SQL: off unless enabled here (admins always see it)
+    SQL_REPORT = os.environ.get('SQL_REPORT', 'False').lower() in ['true', 'on', '1']
+    # /admin/cache-stats, /admin/pool-stats, /admin/startup-report: same rule
+    ADMIN_REPORTS = os.environ.get('ADMIN_REPORTS', 'False').lower() in ['true', 'on', '1']
+
 
 class DevelopmentConfig(envConfig):
     """Development configuration"""
@@ -51,6 +125,7 @@ class TestingConfig(envConfig):
     """Testing configuration"""
     DEBUG = True
     TESTING = True
+    DB_STRICT_LOADING = True
     DATABASE_URL = os.environ.get('DATABASE_URL')
 
 
@@ -1,13 +1,24 @@
 
-from sqlalchemy import create_engine
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, TypeDecorator
-from sqlalchemy.orm import DeclarativeBase, sessionmaker, relationship
+from sqlalchemy import create_engine, event, exc, inspect, insert, select, text, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, TypeDecorator, Index
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker, relationship
 import enum
 import datetime
+import functools
+import hashlib
+import itertools
+import logging
+import threading
+import time
 
 from config import envConfig as ecf
+import sql_profiler
 
 
+logger = logging.getLogger(__name__)
+
 class Base(DeclarativeBase):
     pass
 
@@ -157,8 +168,8 @@ class Category(Base):
     parent_id = Column(Integer, ForeignKey('categories.id'), nullable=True)
     level = Column(Integer, default=1)  # menu level: 1, 2
     visible = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     # Relationships
     parent = relationship("Category", remote_side=[id], backref="children")
@@ -178,8 +189,8 @@ class User(Base):
     avatar = Column(String(255), nullable=True)  # URL to avatar image
     role = Column(UserRoleType(), default=UserRole.USER)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     # Relationships
     created_news = relationship("News", foreign_keys="News.created_by", back_populates="creator")
@@ -192,6 +203,17 @@ class User(Base):
 class News(Base):
     """table news"""
     __tablename__ = 'news'
+    # Composite indexes follow the access paths of model.NewsModel:
+    # equality columns first, then the column used by ORDER BY
+    __table_args__ = (
+        Index('ix_news_status_deleted_created', 'status', 'is_deleted', 'created_at'),
+        Index('ix_news_deleted_created', 'is_deleted', 'created_at'),
+        Index('ix_news_category_status_deleted_created', 'category_id', 'status', 'is_deleted', 'created_at'),
+        Index('ix_news_featured_status_deleted_created', 'is_featured', 'status', 'is_deleted', 'created_at'),
+        Index('ix_news_hot_status_deleted_views', 'is_hot', 'status', 'is_deleted', 'view_count'),
+        Index('ix_news_creator_deleted_created', 'created_by', 'is_deleted', 'created_at'),
+        Index('ix_news_updated', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(255), nullable=False)
@@ -201,6 +223,11 @@ class News(Base):
     thumbnail = Column(String(255), nullable=True)
     images = Column(Text, nullable=True)  # JSON array of image URLs
     
+    # Plain text stats of content, computed on write (excerpts.text_stats)
+    excerpt = Column(Text, nullable=True)
+    word_count = Column(Integer, nullable=True)
+    reading_time = Column(Integer, nullable=True)  # minutes
+    
     # Foreign keys
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
     created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -226,8 +253,8 @@ class News(Base):
     
     # Timestamps
     published_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     # Relationships
     category = relationship("Category", back_populates="news")
@@ -242,7 +269,7 @@ class Tag(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(50), nullable=False, unique=True)
     slug = Column(String(50), nullable=False, unique=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
 
 
 class NewsTag(Base):
@@ -263,7 +290,7 @@ class SavedNews(Base):
     news_id = Column(Integer, ForeignKey('news.id'), nullable=True)
     news_international_id = Column(Integer, ForeignKey('news_international.id'), nullable=True)
     site = Column(String(10), default='vn')
-    created_at = Column(DateTime, default=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
     
     # Relationships
     user = relationship("User", back_populates="saved_news")
@@ -280,7 +307,7 @@ class ViewedNews(Base):
     news_id = Column(Integer, ForeignKey('news.id'), nullable=True)
     news_international_id = Column(Integer, ForeignKey('news_international.id'), nullable=True)
     site = Column(String(10), default='vn')
-    viewed_at = Column(DateTime, default=datetime.datetime.now())
+    viewed_at = Column(DateTime, default=datetime.datetime.now)
     
     # Relationships
     user = relationship("User", back_populates="viewed_news")
@@ -300,8 +327,8 @@ class Comment(Base):
     parent_id = Column(Integer, ForeignKey('comments.id'), nullable=True)  # For reply comments
     site = Column(String(10), default='vn')
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     # Relationships
     user = relationship("User", back_populates="comments")
@@ -313,6 +340,16 @@ class Comment(Base):
 class NewsInternational(Base):
     """table international news"""
     __tablename__ = 'news_international'
+    # Same access paths as table news (model.InternationalNewsModel)
+    __table_args__ = (
+        Index('ix_news_int_status_deleted_created', 'status', 'is_deleted', 'created_at'),
+        Index('ix_news_int_deleted_created', 'is_deleted', 'created_at'),
+        Index('ix_news_int_category_status_deleted_created', 'category_id', 'status', 'is_deleted', 'created_at'),
+        Index('ix_news_int_featured_status_deleted_created', 'is_featured', 'status', 'is_deleted', 'created_at'),
+        Index('ix_news_int_hot_status_deleted_views', 'is_hot', 'status', 'is_deleted', 'view_count'),
+        Index('ix_news_int_creator_deleted_created', 'created_by', 'is_deleted', 'created_at'),
+        Index('ix_news_int_updated', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(255), nullable=False)
@@ -321,6 +358,9 @@ class NewsInternational(Base):
     content = Column(Text, nullable=False)
     thumbnail = Column(String(255), nullable=True)
     images = Column(Text, nullable=True)  # JSON array of image URLs
+    excerpt = Column(Text, nullable=True)
+    word_count = Column(Integer, nullable=True)
+    reading_time = Column(Integer, nullable=True)  # minutes
     category_id = Column(Integer, ForeignKey('categories_international.id'), nullable=False)
     created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     approved_by = Column(Integer, ForeignKey('users.id'), nullable=True)
@@ -337,8 +377,8 @@ class NewsInternational(Base):
     meta_description = Column(Text, nullable=True)
     meta_keywords = Column(String(255), nullable=True)
     published_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     is_deleted = Column(Boolean, default=False)
     tags_string = Column(Text, nullable=True)
@@ -362,8 +402,8 @@ class CategoryInternational(Base):
     parent_id = Column(Integer, ForeignKey('categories_international.id'), nullable=True)
     level = Column(Integer, default=1)  # menu level: 1, 2
     visible = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     # Relationships
     parent = relationship("CategoryInternational", remote_side=[id], backref="children")
@@ -378,7 +418,7 @@ class NewsletterSubscription(Base):
     email = Column(String(100), nullable=False, unique=True)
     is_active = Column(Boolean, default=True)
     unsubscribe_token = Column(String(255), nullable=False, unique=True)
-    subscribed_at = Column(DateTime, default=datetime.datetime.now())
+    subscribed_at = Column(DateTime, default=datetime.datetime.now)
     unsubscribed_at = Column(DateTime, nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     
@@ -395,7 +435,7 @@ class PasswordResetToken(Base):
     token = Column(String(255), nullable=False, unique=True)
     expires_at = Column(DateTime, nullable=False)
     used = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
     
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
@@ -409,7 +449,7 @@ class NewsRejection(Base):
     news_id = Column(Integer, ForeignKey('news.id'), nullable=False)
     rejected_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     reason = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
     
     # Relationships
     news = relationship("News", foreign_keys=[news_id])
@@ -424,7 +464,7 @@ class NewsInternationalRejection(Base):
     news_international_id = Column(Integer, ForeignKey('news_international.id'), nullable=False)
     rejected_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     reason = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
     
     # Relationships
     news_international = relationship("NewsInternational", foreign_keys=[news_international_id])
@@ -440,13 +480,111 @@ class Setting(Base):
     value = Column(Text, nullable=True)
     description = Column(Text, nullable=True)
     category = Column(String(50), nullable=True)  # 'api', 'smtp', 'general', etc.
-    created_at = Column(DateTime, default=datetime.datetime.now())
-    updated_at = Column(DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
 
 # Database connection
 _engine = None
 _SessionLocal = None
+_replicas = None
+
+
+class PoolCounters:
+    """Checkout / checkin counters of the connection pool, checked_out growing means a leak"""
+
+    # upper bounds (ms) of buckets of the histogram of checkout wait time
+    WAIT_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.wait_counts = [0] * (len(self.WAIT_BUCKETS) + 1)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def on_wait(self, seconds: float) -> None:
+        ms = seconds * 1000
+        position = len(self.WAIT_BUCKETS)
+        for i, bound in enumerate(self.WAIT_BUCKETS):
+            if ms <= bound:
+                position = i
+                break
+        with self._lock:
+            self.wait_counts[position] += 1
+            self.wait_total += ms
+            self.wait_max = max(self.wait_max, ms)
+
+    def on_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def reset(self) -> None:
+        """Start from zero (forked worker: the counts are the parent's)"""
+        self.__init__()
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sum(self.wait_counts)
+            labels = [f'<={bound}ms' for bound in self.WAIT_BUCKETS] + [f'>{self.WAIT_BUCKETS[-1]}ms']
+            return {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'checked_out': self.checkouts - self.checkins,
+                'timeouts': self.timeouts,
+                'wait_ms': {
+                    'histogram': dict(zip(labels, self.wait_counts)),
+                    'avg': round(self.wait_total / waits, 3) if waits else 0.0,
+                    'max': round(self.wait_max, 3),
+                },
+            }
+
+
+pool_counters = PoolCounters()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool timing how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_counters.on_timeout()
+            raise
+        finally:
+            pool_counters.on_wait(time.perf_counter() - start)
+
+
+def pool_options(url: str) -> dict:
+    """Arguments of create_engine for the pool, from envConfig (DB_POOL_*)"""
+    options = {
+        'pool_recycle': ecf.DB_POOL_RECYCLE,
+        'pool_pre_ping': ecf.DB_POOL_PRE_PING,
+    }
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        # in-memory SQLite lives in one connection, keep the default pool of the dialect
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=ecf.DB_POOL_SIZE,
+        max_overflow=ecf.DB_MAX_OVERFLOW,
+        pool_timeout=ecf.DB_POOL_TIMEOUT,
+        pool_use_lifo=ecf.DB_POOL_USE_LIFO,
+    )
+    return options
 
 def get_database_url():
     """get URL connect database in config"""
@@ -462,16 +600,306 @@ def create_engine_instance():
     """create engine connect database"""
     global _engine
     if _engine is None:
-        _engine = create_engine(get_database_url(), pool_size=20, max_overflow=20, pool_recycle=3600)
+        url = get_database_url()
+        _engine = create_engine(url, **pool_options(url))
+        event.listen(_engine, 'checkout', pool_counters.on_checkout)
+        event.listen(_engine, 'checkin', pool_counters.on_checkin)
+        sql_profiler.instrument(_engine)
     return _engine
 
+class ReplicaSet:
+    """
+    Engines of the read replicas, picked round-robin
+
+    A replica is checked with SELECT 1 at most every check_interval seconds;
+    when the check fails or a query loses its connection, it is skipped for
+    retry seconds. With no healthy replica reads go to the primary.
+    """
+
+    def __init__(self, urls: list[str], check_interval: float = 30, retry: float = 30):
+        self.urls = urls
+        self.check_interval = check_interval
+        self.retry = retry
+        self.engines = []
+        for index, url in enumerate(urls):
+            engine = create_engine(url, **pool_options(url))
+            event.listen(engine, 'handle_error', functools.partial(self._on_error, index))
+            sql_profiler.instrument(engine)
+            self.engines.append(engine)
+        self._next = itertools.count()
+        self._down_until = [0.0] * len(urls)
+        self._checked_at = [0.0] * len(urls)
+        self.picks = [0] * len(urls)
+        self.failures = [0] * len(urls)
+
+    def _mark_down(self, index: int) -> None:
+        self._down_until[index] = time.monotonic() + self.retry
+        self.failures[index] += 1
+        logger.warning('Replica %s is down, reads go to other databases for %ss',
+                       self._display_url(index), self.retry)
+
+    def _on_error(self, index: int, context) -> None:
+        # context.connection is None when connecting failed
+        if context.is_disconnect or context.connection is None:
+            self._mark_down(index)
+
+    def _healthy(self, index: int, now: float) -> bool:
+        if now < self._down_until[index]:
+            return False
+        if now - self._checked_at[index] < self.check_interval:
+            return True
+        self._checked_at[index] = now
+        try:
+            with self.engines[index].connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except exc.SQLAlchemyError:
+            if time.monotonic() >= self._down_until[index]:  # not already marked by _on_error
+                self._mark_down(index)
+            return False
+        return True
+
+    def pick(self):
+        """Engine of the next healthy replica, None if there is none"""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = next(self._next) % len(self.engines)
+            if self._healthy(index, now):
+                self.picks[index] += 1
+                return self.engines[index]
+        return None
+
+    def _display_url(self, index: int) -> str:
+        return make_url(self.urls[index]).render_as_string(hide_password=True)
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                'url': self._display_url(index),
+                'healthy': now >= self._down_until[index],
+                'picks': self.picks[index],
+                'failures': self.failures[index],
+                'pool': engine.pool.status(),
+            }
+            for index, engine in enumerate(self.engines)
+        ]
+
+
+def get_replicas() -> ReplicaSet:
+    """Read replicas of DATABASE_REPLICA_URLS (empty set when none are configured)"""
+    global _replicas
+    if _replicas is None:
+        _replicas = ReplicaSet(ecf.DATABASE_REPLICA_URLS, ecf.DB_REPLICA_CHECK_INTERVAL, ecf.DB_REPLICA_RETRY)
+    return _replicas
+
+
+def has_replicas() -> bool:
+    return bool(get_replicas().engines)
+
+
+class RoutingSession(Session):
+    """
+    Session sending plain SELECTs to a replica and everything else to the primary
+
+    Once the session writes (flush, INSERT / UPDATE / DELETE) or use_primary()
+    is called, it is pinned: its later reads go to the primary too, so it
+    reads its own writes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pinned = False
+        self.wrote = False
+
+    def use_primary(self) -> None:
+        """Read from the primary for the rest of the session"""
+        self.pinned = True
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = create_engine_instance()
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.pinned = self.wrote = True
+            return primary
+        if (self.pinned or not getattr(clause, 'is_select', False)
+                or getattr(clause, '_for_update_arg', None) is not None):
+            return primary
+        return get_replicas().pick() or primary
+
+
+def on_primary(method):
+    """Decorator of model methods writing: the rows they read before writing come from the primary"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        use_primary = getattr(self.db, 'use_primary', None)
+        if use_primary is not None:
+            use_primary()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def dispose_engines(close: bool = True) -> None:
+    """
+    Drop the pooled connections of the primary and replica engines
+
+    In a forked child pass close=False: the connections belong to the
+    parent, the child only forgets them and opens its own on next use.
+    """
+    if _engine is not None:
+        _engine.dispose(close=close)
+    if _replicas is not None:
+        for engine in _replicas.engines:
+            engine.dispose(close=close)
+
+
+def pool_stats() -> dict:
+    """Counters of pool checkout / checkin and current state of the pool"""
+    pool = create_engine_instance().pool
+    stats = pool_counters.stats()
+    stats['pool'] = pool.status()
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    stats['replicas'] = get_replicas().stats()
+    return stats
+
 def get_session():
     global _SessionLocal
     if _SessionLocal is None:
         engine = create_engine_instance()
-        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
     return _SessionLocal()
 
-def init_db():
+def add_missing_columns(engine) -> list[str]:
+    """
+    Add nullable columns declared in models but missing in existing tables
+    (create_all only creates missing tables), e.g. news.excerpt
+
+    Run by init_db when the schema version changes only. A column added
+    meanwhile by another process booting at the same time is skipped.
+
+    Returns:
+        ['table.column'] added
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            statement = (f'ALTER TABLE {preparer.format_table(table)} '
+                         f'ADD COLUMN {preparer.format_column(column)} {column_type}')
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(statement))
+            except exc.DBAPIError:
+                if column.name not in {c['name'] for c in inspect(engine).get_columns(table.name)}:
+                    raise
+                continue
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+def add_missing_indexes(engine) -> list[str]:
+    """
+    Create indexes declared in models but missing in existing tables
+    (create_all only creates the indexes of the tables it creates)
+
+    Run by init_db when the schema version changes only, after
+    add_missing_columns. An index created meanwhile by another process
+    booting at the same time is skipped.
+
+    Returns:
+        ['index'] created
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            try:
+                index.create(engine, checkfirst=True)
+            except exc.DBAPIError:
+                if index.name not in {i['name'] for i in inspect(engine).get_indexes(table.name)}:
+                    raise
+                continue
+            created.append(index.name)
+    return created
+
+SCHEMA_VERSION_KEY = 'schema_version'
+
+
+def schema_version() -> str:
+    """Stamp of the tables, columns and indexes declared by the models"""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f'{column.name}:{column.type}:{column.nullable}' for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+def stored_schema_version(engine) -> str | None:
+    """Schema version stamped in settings by the last init_db, None if none"""
+    try:
+        with engine.connect() as connection:
+            # table columns, not the mapped class: no mapper configuration at startup
+            table = Setting.__table__
+            return connection.execute(
+                select(table.c.value).where(table.c.key == SCHEMA_VERSION_KEY)
+            ).scalar()
+    except exc.SQLAlchemyError:
+        # no table settings yet
+        return None
+
+def _stamp_schema_version(engine, version: str) -> None:
+    table = Setting.__table__
+    with engine.begin() as connection:
+        updated = connection.execute(
+            update(table).where(table.c.key == SCHEMA_VERSION_KEY).values(value=version)
+        ).rowcount
+        if not updated:
+            connection.execute(insert(table).values(
+                key=SCHEMA_VERSION_KEY, value=version, category='schema',
+                description='Version of the schema created by init_db'))
+
+def init_db(skip_ddl: bool | None = None) -> bool:
+    """
+    Create missing tables; when the schema version stamped in settings is not
+    the one of the models, add missing columns and indexes and stamp the new
+    version
+
+    Args:
+        skip_ddl: only compare the stamp with the models (default DB_SKIP_DDL),
+                  DDL still runs when it is missing or different
+
+    Returns:
+        True if DDL was run
+    """
     engine = create_engine_instance()
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    version = schema_version()
+    stored = stored_schema_version(engine)
+    if stored == version and (ecf.DB_SKIP_DDL if skip_ddl is None else skip_ddl):
+        return False
+    if stored is not None and stored != version:
+        logger.warning('Schema version of database is %s, models are %s: running DDL', stored, version)
+    Base.metadata.create_all(engine)
+    if stored != version:
+        # columns and indexes of existing tables: once per schema change, not at every boot
+        add_missing_columns(engine)
+        add_missing_indexes(engine)
+        _stamp_schema_version(engine, version)
+    return True
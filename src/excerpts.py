@@ -0,0 +1,124 @@
+"""
+Excerpts - plain text excerpt, word count and reading time of articles
+
+Computed once when an article is written (NewsModel.create / update /
+bulk_create) and stored in columns excerpt, word_count and reading_time,
+so rendering cards does no HTML parsing.
+
+Backfill rows written before these columns existed (from folder src):
+    python excerpts.py              # rows without excerpt
+    python excerpts.py --all        # recompute every row
+"""
+import argparse
+import html
+import math
+import re
+
+from sqlalchemy import bindparam
+
+import database as db
+
+
+EXCERPT_WORDS = 50
+WORDS_PER_MINUTE = 200
+
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# kind -> table of articles
+TABLES = {
+    'news': db.News.__table__,
+    'news_international': db.NewsInternational.__table__,
+}
+
+
+def plain_words(content: str | None) -> list[str]:
+    """Words of content without HTML tags and entities"""
+    if not content:
+        return []
+    return html.unescape(_TAG_RE.sub(' ', content)).split()
+
+
+def _excerpt(words: list[str], max_words: int) -> str:
+    if len(words) > max_words:
+        return ' '.join(words[:max_words]) + '...'
+    return ' '.join(words)
+
+
+def make_excerpt(content: str | None, max_words: int = EXCERPT_WORDS) -> str:
+    """First max_words words of the plain text of content, '...' when cut"""
+    return _excerpt(plain_words(content), max_words)
+
+
+def text_stats(content: str | None) -> dict:
+    """{'excerpt', 'word_count', 'reading_time'} of content (one parse)"""
+    words = plain_words(content)
+    return {
+        'excerpt': _excerpt(words, EXCERPT_WORDS),
+        'word_count': len(words),
+        'reading_time': math.ceil(len(words) / WORDS_PER_MINUTE),
+    }
+
+
+def backfill(session, kind: str, recompute: bool = False, batch_size: int = 500) -> int:
+    """
+    Write excerpt / word_count / reading_time of rows of kind, updated_at is kept
+
+    Returns:
+        Amount of rows written
+    """
+    table = TABLES[kind]
+    statement = (
+        table.update()
+        .where(table.c.id == bindparam('b_id'))
+        .values(excerpt=bindparam('b_excerpt'), word_count=bindparam('b_word_count'),
+                reading_time=bindparam('b_reading_time'), updated_at=table.c.updated_at)
+    )
+
+    written = 0
+    last_id = 0
+    while True:
+        query = (
+            table.select()
+            .with_only_columns(table.c.id, table.c.content)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        )
+        if not recompute:
+            query = query.where(table.c.excerpt.is_(None))
+        rows = session.execute(query).all()
+        if not rows:
+            break
+
+        params = []
+        for row_id, content in rows:
+            stats = text_stats(content)
+            params.append({'b_id': row_id, 'b_excerpt': stats['excerpt'],
+                           'b_word_count': stats['word_count'], 'b_reading_time': stats['reading_time']})
+        session.execute(statement, params)
+        session.commit()
+
+        written += len(rows)
+        last_id = rows[-1][0]
+    return written
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--all', action='store_true', help='recompute rows which already have an excerpt')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    # init_db adds the columns to an existing database
+    db.init_db()
+    session = db.get_session()
+    try:
+        for kind in TABLES:
+            written = backfill(session, kind, recompute=args.all, batch_size=args.batch_size)
+            print(f'{kind}: {written} row(s) written')
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
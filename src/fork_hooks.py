@@ -0,0 +1,55 @@
+"""
+Fork hooks - per worker state of pre-forking servers (gunicorn / uWSGI preload)
+
+With preload the app is built once in the master and workers are forked
+from it, sharing the app code copy-on-write. What belongs to one process
+must not be shared: after_fork_in_child() makes the worker drop the pooled
+connections of the master (without closing them), the views buffered by
+the master, its single flight calls, a search index it left half built
+and its metrics / pool counters. A worker replacing one that crashed
+reports the view increments that one lost.
+
+It is called by the post_fork hook of gunicorn.conf.py, by the uWSGI
+postfork hook of wsgi.py and, through os.register_at_fork, after any
+os.fork(); it runs once per process.
+"""
+import logging
+import os
+
+import database as db
+import metrics
+import search
+import single_flight
+import view_counter
+
+
+logger = logging.getLogger(__name__)
+
+_registered = False
+_done_in_pid = os.getpid()
+
+
+def after_fork_in_child() -> None:
+    """Reset the state copied from the parent, once per process"""
+    global _done_in_pid
+    if _done_in_pid == os.getpid():
+        return
+    _done_in_pid = os.getpid()
+
+    # connections of the parent: forget them, never close them from here
+    db.dispose_engines(close=False)
+    db.pool_counters.reset()
+    view_counter.after_fork()
+    view_counter.report_lost()
+    single_flight.after_fork()
+    search.after_fork()
+    metrics.registry.reset()
+    logger.debug('Process state reset after fork in %s', _done_in_pid)
+
+
+def register() -> None:
+    """Run after_fork_in_child in every child forked from now on"""
+    global _registered
+    if not _registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=after_fork_in_child)
+        _registered = True
@@ -0,0 +1,21 @@
+"""
+gunicorn configuration (from folder src):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+
+# build the app once in the master, workers share its code copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    # connections, buffered views and counters of the master stay there
+    import fork_hooks
+    fork_hooks.after_fork_in_child()
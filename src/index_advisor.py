@@ -0,0 +1,171 @@
+"""
+Index advisor - run EXPLAIN on every query of NewsModel / InternationalNewsModel
+and flag full table scans and filesorts
+
+Usage (from folder src, DATABASE_URL point to the database to check):
+    python index_advisor.py              # explain queries
+    python index_advisor.py --seed 5000  # seed articles first if table is empty
+    python index_advisor.py --ddl        # print CREATE INDEX for indexes missing in database
+"""
+import argparse
+import sys
+
+from sqlalchemy import event, inspect
+from sqlalchemy.schema import CreateIndex
+
+import database as db
+import model
+import utils
+from benchmarks import dataset
+
+
+# (name, function(session, sample) -> run one query method)
+NEWS_QUERIES = [
+    ('NewsModel.get_by_id', lambda s, x: model.NewsModel(s).get_by_id(x['news_id'])),
+    ('NewsModel.get_by_slug', lambda s, x: model.NewsModel(s).get_by_slug(x['news_slug'])),
+    ('NewsModel.get_all', lambda s, x: model.NewsModel(s).get_all(limit=20, offset=200)),
+    ('NewsModel.get_by_creator', lambda s, x: model.NewsModel(s).get_by_creator(x['user_id'], limit=20)),
+    ('NewsModel.get_published', lambda s, x: model.NewsModel(s).get_published(limit=20, offset=200)),
+    ('NewsModel.get_published(cursor)', lambda s, x: model.NewsModel(s).get_published(limit=20, cursor=x['news_cursor'])),
+    ('NewsModel.get_by_category', lambda s, x: model.NewsModel(s).get_by_category(x['category_id'], limit=20)),
+    ('NewsModel.get_by_categories', lambda s, x: model.NewsModel(s).get_by_categories([x['category_id']], limit=20)),
+    ('NewsModel.get_featured', lambda s, x: model.NewsModel(s).get_featured(limit=10)),
+    ('NewsModel.get_hot', lambda s, x: model.NewsModel(s).get_hot(limit=10)),
+    ('NewsModel.search', lambda s, x: model.NewsModel(s).search('news', limit=20)),
+    ('InternationalNewsModel.get_by_id', lambda s, x: model.InternationalNewsModel(s).get_by_id(x['int_news_id'])),
+    ('InternationalNewsModel.get_published', lambda s, x: model.InternationalNewsModel(s).get_published(limit=20)),
+    ('InternationalNewsModel.get_by_category', lambda s, x: model.InternationalNewsModel(s).get_by_category(x['int_category_id'], limit=20)),
+    ('InternationalNewsModel.get_featured', lambda s, x: model.InternationalNewsModel(s).get_featured(limit=10)),
+    ('InternationalNewsModel.get_hot', lambda s, x: model.InternationalNewsModel(s).get_hot(limit=10)),
+]
+
+
+def capture_statements(engine, fn):
+    """Run fn and return list of (statement, parameters) sent to the database"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def explain(connection, statement, parameters) -> tuple[list[str], list[str]]:
+    """
+    Explain one statement
+
+    Returns:
+        (plan, problems) - readable plan lines and problems found (scan / filesort)
+    """
+    plan, problems = [], []
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        for row in rows:
+            detail = row[-1]
+            plan.append(detail)
+            if detail.startswith('SCAN') and ' USING ' not in detail:
+                problems.append(f'full scan: {detail}')
+            if 'USE TEMP B-TREE' in detail:
+                problems.append(f'filesort: {detail}')
+    elif dialect in ('mysql', 'mariadb'):
+        result = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        for row in result.mappings():
+            extra = row.get('Extra') or ''
+            plan.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} {extra}")
+            if row.get('type') == 'ALL':
+                problems.append(f"full scan on {row.get('table')}")
+            if 'filesort' in extra:
+                problems.append(f"filesort on {row.get('table')}")
+            if 'temporary' in extra:
+                problems.append(f"temporary table on {row.get('table')}")
+    else:
+        plan.append(f'EXPLAIN is not supported for dialect {dialect}')
+
+    return plan, problems
+
+
+def missing_indexes(engine) -> list:
+    """List index declared on models but not present in database"""
+    inspector = inspect(engine)
+    missing = []
+    for table in (db.News.__table__, db.NewsInternational.__table__):
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        missing.extend(ix for ix in table.indexes if ix.name not in existing)
+    return missing
+
+
+def seed(session, amount: int) -> None:
+    """Insert amount articles on both sites (benchmarks.dataset) if table news is empty"""
+    if session.query(db.News.id).first() is not None:
+        return
+    dataset.seed(session, **dataset.volumes(amount))
+
+
+def sample_values(session) -> dict:
+    """Pick real ids / slugs so every query hit existing rows"""
+    news = session.query(db.News).order_by(db.News.id.desc()).first()
+    int_news = session.query(db.NewsInternational).order_by(db.NewsInternational.id.desc()).first()
+    if news is None or int_news is None:
+        raise SystemExit('Database has no article, run again with --seed N')
+    return {
+        'news_id': news.id,
+        'news_slug': news.slug,
+        'news_cursor': utils.encode_cursor(news.created_at, news.id),
+        'user_id': news.created_by,
+        'category_id': news.category_id,
+        'int_news_id': int_news.id,
+        'int_category_id': int_news.category_id,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0, help='seed N articles per site if table news is empty')
+    parser.add_argument('--ddl', action='store_true', help='print CREATE INDEX of missing indexes')
+    parser.add_argument('--verbose', action='store_true', help='print plan of every statement')
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    engine = db.create_engine_instance()
+
+    if args.ddl:
+        for index in missing_indexes(engine):
+            print(str(CreateIndex(index).compile(engine)).strip() + ';')
+
+    session = db.get_session()
+    try:
+        if args.seed:
+            seed(session, args.seed)
+        sample = sample_values(session)
+
+        flagged = 0
+        for name, run in NEWS_QUERIES:
+            statements = capture_statements(engine, lambda: run(session, sample))
+            with engine.connect() as connection:
+                for statement, parameters in statements:
+                    plan, problems = explain(connection, statement, parameters)
+                    status = 'WARN' if problems else 'OK  '
+                    print(f'[{status}] {name}')
+                    for problem in problems:
+                        print(f'         - {problem}')
+                    if args.verbose:
+                        for line in plan:
+                            print(f'           {line}')
+                    flagged += bool(problems)
+    finally:
+        session.close()
+
+    print(f'\n{flagged} statement(s) flagged')
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,31 @@
 """
 Main application file - initialization for Flask app và register routes
 """
+import time
+
+_imports_started = time.perf_counter()
+
 from dotenv import load_dotenv
 from flask import Flask, request, session
 from datetime import datetime, timezone
-from flask_babel import Babel
 import pytz
-import re
 
 from config import envConfig
 from database import init_db, get_session
+import excerpts
+import metrics
+import model
+import request_session
+import search
+import sql_profiler
+import startup
+import view_counter
 
 from client_routes import client_bp
 from admin_routes import admin_bp
 
+_imports_seconds = time.perf_counter() - _imports_started
+
 load_dotenv()  # Load varibale enviroment from file .env
 
 def create_app():
@@ -26,6 +38,9 @@ def create_app():
     Returns:
         Flask app instance
     """
+    report = startup.StartupReport()
+    report.add('imports', _imports_seconds)
+
     app = Flask(__name__)
     app.config.from_object(envConfig)
 
@@ -37,26 +52,41 @@ def create_app():
     # babel = Babel(app)
     # babel.init_app(app, locale_selector=get_locale)
 
-    # initialization database
+    report.mark('app')
+
+    # initialization database (only a version check with DB_SKIP_DDL)
     init_db()
+    report.mark('database')
+
+    # search index built in background, searches use the LIKE query until ready
+    search.start()
+
+    # statements per request, slow queries and N+1 suspects (SQL_PROFILER),
+    # registered first so its teardown runs after the commit of the session
+    sql_profiler.init_app(app)
+
+    # one session per request, released at teardown
+    request_session.init_app(app)
+
+    # fail when serialization lazy loads (N+1 queries), DB_STRICT_LOADING
+    model.set_strict_loading(app.config['DB_STRICT_LOADING'])
+
+    # report view increments lost by workers crashed before flush
+    view_counter.report_lost()
+    report.mark('extensions')
 
     app.register_blueprint(client_bp)
     app.register_blueprint(admin_bp)
+    report.mark('blueprints')
+
+    # per endpoint counts, latency and sizes, served on /metrics
+    metrics.init_app(app)
+
+    report.mark('instrumentation')
 
-    # Debug: Log mọi request
-    @app.before_request
-    def log_request():
-        print(f"\n>>> INCOMING REQUEST: {request.method} {request.path}")
-        # print(f">>> Endpoint: {request.endpoint}")
-        # print(f">>> View args: {request.view_args}\n")
-    
     # Debug: In ra tất cả routes
-    print("\n" + "="*50)
-    print("REGISTERED ROUTES:")
-    print("="*50)
-    for rule in app.url_map.iter_rules():
-        print(f"{rule.rule} -> {rule.endpoint} [{', '.join(rule.methods)}]")
-    print("="*50 + "\n")
+    if app.debug:
+        print_routes(app)
 
     # Đăng ký Jinja2 filters
     @app.template_filter('datetime_format')
@@ -161,28 +191,11 @@ def create_app():
     @app.template_filter('get_description')
     def get_description_filter(content):
         """
-        Lấy mô tả từ content: loại bỏ HTML tags và lấy 200 từ đầu
+        Lấy mô tả từ content: loại bỏ HTML tags và lấy 50 từ đầu
         Nếu content là None hoặc rỗng, trả về chuỗi rỗng
+        (bài viết đã lưu sẵn mô tả trong cột excerpt, dùng news.excerpt)
         """
-        if not content:
-            return ''
-        
-        # Loại bỏ HTML tags
-        text = re.sub(r'<[^>]+>', '', content)
-        
-        # Loại bỏ các ký tự đặc biệt và normalize whitespace
-        text = re.sub(r'&nbsp;', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        # Chia thành các từ
-        words = text.split()
-        
-        # Lấy 50 từ đầu
-        if len(words) > 50:
-            return ' '.join(words[:50]) + '...'
-        else:
-            return text
+        return excerpts.make_excerpt(content)
     
     # # Context processor để categories có sẵn trong tất cả templates
     # @app.context_processor
@@ -198,11 +211,24 @@ def create_app():
     #         # Nếu có lỗi (ví dụ: database chưa khởi tạo), trả về list rỗng
     #         return dict(categories=[])
 
+    report.mark('filters')
+    app.extensions['startup_report'] = report
+    report.log()
     return app
 
 
+def print_routes(app):
+    print("\n" + "="*50)
+    print("REGISTERED ROUTES:")
+    print("="*50)
+    for rule in app.url_map.iter_rules():
+        print(f"{rule.rule} -> {rule.endpoint} [{', '.join(rule.methods)}]")
+    print("="*50 + "\n")
+
+
 if __name__ == '__main__':
     app = create_app()
+    print_routes(app)
     print("\n" + "="*50)
     print("  Website News - Flask Server")
     print("="*50)
@@ -0,0 +1,261 @@
+"""
+Metrics - per endpoint request counts, latency and response size
+
+Every request is recorded in memory of the worker process (count per
+status code, histograms of latency and size). Each process writes its
+counters to METRICS_DIR/metrics-<pid>.json at most every
+METRICS_FLUSH_INTERVAL seconds and when it exits; /metrics sums the files
+of all processes and answers in the Prometheus text format, with p50 / p95
+/ p99 estimated from the summed histograms.
+
+METRICS_DIR defaults to a folder of this deploy (user and install path).
+The file of a process which is gone is removed when metrics are collected:
+its counters leave the sums, seen by Prometheus as a counter reset.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+from config import envConfig as ecf
+import utils
+
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of histogram buckets, +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)  # bytes
+QUANTILES = (0.5, 0.95, 0.99)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _bucket(bounds: tuple, value: float) -> int:
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
+
+
+class Registry:
+    """Counters of the requests handled by this process"""
+
+    def __init__(self, directory: str | None = None, flush_interval: float = 5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # (endpoint, method) -> series dict
+        self._series = {}
+        self._flushed_at = 0.0
+
+    def _new_series(self) -> dict:
+        return {
+            'status': {},
+            'latency': [0] * (len(LATENCY_BUCKETS) + 1),
+            'latency_sum': 0.0,
+            'size': [0] * (len(SIZE_BUCKETS) + 1),
+            'size_sum': 0,
+        }
+
+    def record(self, endpoint: str, method: str, status: int, seconds: float, size: int) -> None:
+        latency_index = _bucket(LATENCY_BUCKETS, seconds)
+        size_index = _bucket(SIZE_BUCKETS, size)
+        status = str(status)
+        with self._lock:
+            series = self._series.get((endpoint, method))
+            if series is None:
+                series = self._series[(endpoint, method)] = self._new_series()
+            series['status'][status] = series['status'].get(status, 0) + 1
+            series['latency'][latency_index] += 1
+            series['latency_sum'] += seconds
+            series['size'][size_index] += 1
+            series['size_sum'] += size
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def snapshot(self) -> list[dict]:
+        """Copy of the series of this process"""
+        with self._lock:
+            return [
+                {
+                    'endpoint': endpoint,
+                    'method': method,
+                    'status': dict(series['status']),
+                    'latency': list(series['latency']),
+                    'latency_sum': series['latency_sum'],
+                    'size': list(series['size']),
+                    'size_sum': series['size_sum'],
+                }
+                for (endpoint, method), series in self._series.items()
+            ]
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def flush(self) -> None:
+        """Write the series of this process to its file (atomic replace)"""
+        self._flushed_at = time.monotonic()
+        path = self._path(os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp = f'{path}.tmp'
+            with open(temp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp, path)
+        except OSError:
+            logger.warning('Cannot write metrics to %s', self.directory)
+
+    def collect(self) -> list[dict]:
+        """Series of the running processes summed by (endpoint, method)"""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            if not pid.isdigit() or not utils.pid_alive(int(pid)):
+                # left by an exited worker (or a previous deploy)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for row in rows:
+                key = (row['endpoint'], row['method'])
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = row
+                    continue
+                for status, count in row['status'].items():
+                    total['status'][status] = total['status'].get(status, 0) + count
+                for name in ('latency', 'size'):
+                    total[name] = [a + b for a, b in zip(total[name], row[name])]
+                total['latency_sum'] += row['latency_sum']
+                total['size_sum'] += row['size_sum']
+        return list(merged.values())
+
+    def reset(self) -> None:
+        """Forget the series of this process (forked worker starting empty)"""
+        # new lock: the one copied from the parent may be held by one of its threads
+        self._lock = threading.Lock()
+        self._series = {}
+        self._flushed_at = 0.0
+
+
+def quantile(bounds: tuple, counts: list[int], q: float) -> float | None:
+    """Value at quantile q of a histogram, linear inside the bucket (as histogram_quantile)"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if seen + count >= rank and count:
+            if i == len(bounds):
+                # +Inf bucket: the highest finite bound is the best estimate
+                return bounds[-1]
+            lower = bounds[i - 1] if i else 0
+            return lower + (bounds[i] - lower) * (rank - seen) / count
+        seen += count
+    return bounds[-1]
+
+
+def _labels(**labels) -> str:
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _histogram(lines: list, name: str, bounds: tuple, counts: list, total: float, **labels) -> None:
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    cumulative += counts[-1]
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {total}')
+    lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+
+
+def render(series: list[dict]) -> str:
+    """Prometheus text exposition of series"""
+    series = sorted(series, key=lambda row: (row['endpoint'], row['method']))
+    lines = [
+        '# HELP http_requests_total Requests handled, by endpoint, method and status code',
+        '# TYPE http_requests_total counter',
+    ]
+    for row in series:
+        for status, count in sorted(row['status'].items()):
+            lines.append(f'http_requests_total{_labels(endpoint=row["endpoint"], method=row["method"], status=status)} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Time spent handling requests',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for row in series:
+        _histogram(lines, 'http_request_duration_seconds', LATENCY_BUCKETS, row['latency'], row['latency_sum'],
+                   endpoint=row['endpoint'], method=row['method'])
+
+    lines += [
+        '# HELP http_request_duration_quantile_seconds Latency quantiles estimated from the histogram',
+        '# TYPE http_request_duration_quantile_seconds gauge',
+    ]
+    for row in series:
+        for q in QUANTILES:
+            value = quantile(LATENCY_BUCKETS, row['latency'], q)
+            if value is not None:
+                labels = _labels(endpoint=row['endpoint'], method=row['method'], quantile=q)
+                lines.append(f'http_request_duration_quantile_seconds{labels} {value:.6f}')
+
+    lines += [
+        '# HELP http_response_size_bytes Size of response bodies',
+        '# TYPE http_response_size_bytes histogram',
+    ]
+    for row in series:
+        _histogram(lines, 'http_response_size_bytes', SIZE_BUCKETS, row['size'], row['size_sum'],
+                   endpoint=row['endpoint'], method=row['method'])
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(ecf.METRICS_DIR, ecf.METRICS_FLUSH_INTERVAL)
+if registry.directory:
+    # requests since the last flush
+    atexit.register(registry.flush)
+
+
+def _start_timer() -> None:
+    g.metrics_started = time.perf_counter()
+
+
+def _record(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # unmatched URLs share one label, paths would make unbounded series
+        endpoint = request.endpoint or 'unmatched'
+        registry.record(endpoint, request.method, response.status_code,
+                        time.perf_counter() - started, response.content_length or 0)
+    return response
+
+
+def metrics_view():
+    return Response(render(registry.collect()), content_type=CONTENT_TYPE)
+
+
+def init_app(app) -> None:
+    """Record every request and serve /metrics"""
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
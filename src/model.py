@@ -2,12 +2,379 @@
 Model classes để quản lý các thao tác thêm, xóa, sửa, lấy dữ liệu của web tin tức
 và sử dụng thư viện SQLAlchemy ORM
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, or_
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload
+from sqlalchemy import and_, desc, func, insert, literal, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
-from typing import List, Optional
+from itertools import islice
+from types import SimpleNamespace
+from typing import Iterable, Iterator, List, Optional
+import re
+import threading
+import time
+import category_tree
 import database as db
+import excerpts
+import response_cache
+import search
 import utils
+import view_counter
+
+
+# Columns of an article card (listing pages, JSON API): never load content,
+# images, SEO and tags_string TEXT columns for a list
+CARD_COLUMNS = (
+    'id', 'title', 'slug', 'summary', 'excerpt', 'reading_time', 'thumbnail', 'category_id', 'author',
+    'status', 'is_featured', 'is_hot', 'is_api', 'view_count',
+    'published_at', 'created_at', 'updated_at',
+)
+
+
+# Columns of the category of a card (utils._news_to_dict)
+CARD_CATEGORY_COLUMNS = ('id', 'name', 'slug')
+
+# When True (TESTING), touching a column or relationship not loaded by a list
+# query raises instead of silently issuing one more query per item (N+1)
+_strict_loading = False
+
+
+def set_strict_loading(enabled: bool) -> None:
+    global _strict_loading
+    _strict_loading = enabled
+
+
+def _cards(session: Session, entity):
+    """
+    Query of News / NewsInternational loading only the card columns, with
+    the category joined in the same query
+    """
+    category = entity.category.property.mapper.class_
+    options = [
+        load_only(*[getattr(entity, column) for column in CARD_COLUMNS], raiseload=_strict_loading),
+        joinedload(entity.category).load_only(
+            *[getattr(category, column) for column in CARD_CATEGORY_COLUMNS], raiseload=_strict_loading
+        ),
+    ]
+    if _strict_loading:
+        options.append(raiseload('*'))
+    return session.query(entity).options(*options)
+
+
+class _TotalCache:
+    """
+    Cache of totals of NewsModel.get_by_creator keyed by
+    (creator, status, search, include_deleted). Entries of a creator are
+    dropped when one of his articles is written; TTL bounds staleness of
+    writes done by other workers.
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def get(self, key) -> int | None:
+        with self._lock:
+            entry = self._totals.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, key, total: int) -> None:
+        with self._lock:
+            if len(self._totals) >= self.max_entries:
+                self._totals.clear()
+            self._totals[key] = (total, time.monotonic() + self.ttl)
+
+    def invalidate(self, creator_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._totals if key[0] == creator_id]:
+                del self._totals[key]
+
+
+_creator_totals = _TotalCache()
+
+# Largest total counted by total_mode='approximate'
+APPROX_TOTAL_CAP = 1000
+
+
+def _slugify(title: str) -> str:
+    """create slug from title"""
+    slug = title.lower()
+    slug = re.sub(r'[^\w\s-]', '', slug)
+    slug = re.sub(r'[-\s]+', '-', slug)
+    return slug.strip('-')
+
+
+# Max slugs in one lookup query: one query per batch of bulk_create (default
+# 500 rows), SQLite limits expression depth to 1000 (one OR term per slug)
+_SLUG_LOOKUP_CHUNK = 500
+
+
+def _unique_slugs(session: Session, entity, slugs: list[str]) -> list[str]:
+    """
+    Make slugs unique against the table and against each other, suffix
+    -2, -3... on collision. Slugs already used are read with one query per
+    _SLUG_LOOKUP_CHUNK distinct slugs.
+    """
+    bases = list(dict.fromkeys(slugs))
+    taken = set()
+    for start in range(0, len(bases), _SLUG_LOOKUP_CHUNK):
+        chunk = bases[start:start + _SLUG_LOOKUP_CHUNK]
+        # the slug itself, or slug-<digits>: a range scan of the unique index
+        conditions = [entity.slug.in_(chunk)] + [
+            and_(entity.slug >= f'{base}-0', entity.slug < f'{base}-:') for base in chunk
+        ]
+        taken.update(slug for (slug,) in session.query(entity.slug).filter(or_(*conditions)))
+
+    next_suffix = {}
+    result = []
+    for base in slugs:
+        candidate = base
+        suffix = next_suffix.get(base, 2)
+        while candidate in taken:
+            candidate = f'{base}-{suffix}'
+            suffix += 1
+        next_suffix[base] = suffix
+        taken.add(candidate)
+        result.append(candidate)
+    return result
+
+
+# Columns required by bulk_create
+_BULK_REQUIRED = ('title', 'content', 'category_id', 'created_by')
+
+
+def _bulk_create(session: Session, entity, rows: Iterable[dict],
+                 batch_size: int = 500) -> Iterator[dict]:
+    """
+    Insert articles in batches (executemany), one commit per batch
+
+    Yields:
+        one result per input row, in input order:
+        {'index': position in rows, 'slug': slug inserted, 'ok': bool, 'error': message or None}
+    """
+    columns = set(entity.__table__.columns.keys())
+    iterator = iter(rows)
+    index = 0
+
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+
+        results = []
+        valid = []
+        for row in batch:
+            missing = [key for key in _BULK_REQUIRED if not row.get(key)]
+            unknown = set(row) - columns
+            if missing or unknown:
+                error = f'missing {", ".join(missing)}' if missing else f'unknown {", ".join(sorted(unknown))}'
+                results.append({'index': index, 'slug': None, 'ok': False, 'error': error})
+            else:
+                values = dict(row)
+                values['slug'] = values.get('slug') or _slugify(values['title']) or 'news'
+                values.update(excerpts.text_stats(values['content']))
+                valid.append(values)
+                results.append({'index': index, 'slug': None, 'ok': True, 'error': None})
+            index += 1
+
+        if valid:
+            slugs = _unique_slugs(session, entity, [values['slug'] for values in valid])
+            for values, slug in zip(valid, slugs):
+                values['slug'] = slug
+
+            # executemany needs the same keys for every row of a statement
+            groups = {}
+            for values in valid:
+                groups.setdefault(frozenset(values), []).append(values)
+            try:
+                for group in groups.values():
+                    session.execute(insert(entity), group)
+                session.commit()
+                failed = {}
+            except IntegrityError:
+                session.rollback()
+                # find rows in error one by one
+                failed = {}
+                for position, values in enumerate(valid):
+                    try:
+                        session.execute(insert(entity), [values])
+                        session.commit()
+                    except IntegrityError as e:
+                        session.rollback()
+                        failed[position] = str(e.orig)
+
+            valid_results = (result for result in results if result['ok'])
+            for position, (result, values) in enumerate(zip(valid_results, valid)):
+                result['slug'] = values['slug']
+                if position in failed:
+                    result['ok'] = False
+                    result['error'] = failed[position]
+
+            for creator_id in {values['created_by'] for values in valid}:
+                _creator_totals.invalidate(creator_id)
+            site = 'vn' if entity is db.News else 'en'
+            tags = set()
+            for values in valid:
+                tags |= response_cache.article_tags(site, SimpleNamespace(
+                    id=None,
+                    category_id=values['category_id'],
+                    status=values.get('status', db.NewsStatus.DRAFT),
+                    is_deleted=values.get('is_deleted', False),
+                    is_featured=values.get('is_featured', False),
+                    is_hot=values.get('is_hot', False),
+                ))
+            response_cache.invalidate(session, tags)
+
+        yield from results
+
+
+def _paginate(query, entity, limit: int | None = None, offset: int = 0,
+              cursor: str | None = None):
+    """
+    Order query by (created_at, id) newest first and cut one page
+
+    Args:
+        query: SQLAlchemy query of News / NewsInternational
+        entity: db.News or db.NewsInternational
+        limit: Amount article for a page
+        offset: Position start (ignored when cursor is given)
+        cursor: Opaque cursor from utils.next_cursor, keyset pagination
+                seek after (created_at, id) of last row instead of skip rows
+
+    Raises:
+        ValueError: if cursor is invalid
+    """
+    if cursor:
+        created_at, last_id = utils.decode_cursor(cursor)
+        if created_at is None:
+            # last row had no created_at: only such rows are left, by id
+            query = query.filter(entity.created_at.is_(None), entity.id < last_id)
+        else:
+            query = query.filter(
+                or_(
+                    entity.created_at < created_at,
+                    and_(entity.created_at == created_at, entity.id < last_id),
+                    entity.created_at.is_(None),
+                )
+            )
+
+    # NULL created_at sorts last in DESC order on MySQL and SQLite
+    query = query.order_by(desc(entity.created_at), desc(entity.id))
+
+    if limit:
+        query = query.limit(limit)
+        if not cursor:
+            query = query.offset(offset)
+
+    return query
+
+
+def _top_per_group(session: Session, entity, groups: dict[int, list[int]],
+                   per_group: int) -> dict[int, list]:
+    """
+    Newest published articles of every group of categories in one query
+    (UNION ALL of one LIMIT per_group branch per group)
+
+    Args:
+        groups: {group id: [category ids]}, e.g. top level category -> itself and its descendants
+        per_group: amount article per group
+
+    Returns:
+        {group id: [articles]} (card columns only)
+    """
+    result = {group_id: [] for group_id in groups}
+    branches = []
+    for group_id, category_ids in groups.items():
+        if not category_ids:
+            continue
+        branch = (
+            select(entity.id.label('id'), literal(group_id).label('group_id'))
+            .where(
+                entity.category_id.in_(category_ids),
+                entity.status == db.NewsStatus.PUBLISHED,
+                entity.is_deleted == False,
+            )
+            .order_by(desc(entity.created_at), desc(entity.id))
+            .limit(per_group)
+            .subquery()
+        )
+        branches.append(select(branch.c.id, branch.c.group_id))
+    if not branches:
+        return result
+
+    top = union_all(*branches).subquery()
+    rows = (
+        _cards(session, entity)
+        .join(top, entity.id == top.c.id)
+        .add_columns(top.c.group_id)
+        .order_by(desc(entity.created_at), desc(entity.id))
+        .all()
+    )
+    for news, group_id in rows:
+        result[group_id].append(news)
+    return result
+
+
+def _load_in_order(query, entity, ids: list[int]) -> list:
+    """Load published articles by ids and keep the order of ids (search ranking)"""
+    if not ids:
+        return []
+    rows = query.filter(
+        entity.id.in_(ids),
+        entity.status == db.NewsStatus.PUBLISHED,
+        entity.is_deleted == False,
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[news_id] for news_id in ids if news_id in by_id]
+
+
+def _page_versions(session: Session, entity, category_ids: list[int],
+                   limit: int | None = None, offset: int = 0) -> list[tuple]:
+    """(id, updated_at) of a page of articles of categories, without loading the articles"""
+    if not category_ids:
+        return []
+    query = session.query(entity.id, entity.updated_at).filter(
+        entity.category_id.in_(category_ids),
+        entity.status == db.NewsStatus.PUBLISHED,
+        entity.is_deleted == False,
+    )
+    return [tuple(row) for row in _paginate(query, entity, limit, offset).all()]
+
+
+def _version_by_slug(session: Session, entity, slug: str):
+    """(id, updated_at) of the article of slug without loading the row, None if missing"""
+    return session.query(entity.id, entity.updated_at).filter(
+        entity.slug == slug,
+        entity.is_deleted == False,
+    ).first()
+
+
+def _listing_version(session: Session, entity, category_ids: list[int] | None = None,
+                     featured: bool = False, hot: bool = False) -> tuple:
+    """
+    (count, max updated_at[, sum of views]) of published articles
+
+    Every write (create, update, approve, reject, delete) changes it, so it
+    validates a cached listing without loading the articles.
+    """
+    columns = [func.count(entity.id), func.max(entity.updated_at)]
+    if hot:
+        # hot news are ranked by views, which do not touch updated_at
+        columns.append(func.sum(entity.view_count))
+    query = session.query(*columns).filter(
+        entity.status == db.NewsStatus.PUBLISHED,
+        entity.is_deleted == False,
+    )
+    if category_ids is not None:
+        query = query.filter(entity.category_id.in_(category_ids))
+    if featured:
+        query = query.filter(entity.is_featured == True)
+    if hot:
+        query = query.filter(entity.is_hot == True)
+    return tuple(query.one())
 
 
 class NewsModel:
@@ -22,6 +389,7 @@ class NewsModel:
         """
         self.db = db_session
     
+    @db.on_primary
     def create(self, title: str, content: str, category_id: int, 
                created_by: int, summary: str = None, thumbnail: str = None,
                slug: str = None, status: db.NewsStatus = db.NewsStatus.DRAFT) -> db.News:
@@ -42,7 +410,7 @@ class NewsModel:
             News object
         """
         if slug is None:
-            slug = self._generate_slug(title)
+            slug = _unique_slugs(self.db, db.News, [self._generate_slug(title) or 'news'])[0]
         
         news = db.News(
             title=title,
@@ -52,12 +420,16 @@ class NewsModel:
             thumbnail=thumbnail,
             category_id=category_id,
             created_by=created_by,
-            status=status
+            status=status,
+            **excerpts.text_stats(content)
         )
         
         self.db.add(news)
         self.db.commit()
         self.db.refresh(news)
+        search.notify('news', news)
+        _creator_totals.invalidate(news.created_by)
+        response_cache.invalidate(self.db, response_cache.article_tags('vn', news))
         return news
     
     def get_by_id(self, news_id: int, include_deleted: bool = False) -> Optional[db.News]:
@@ -80,8 +452,18 @@ class NewsModel:
             db.News.is_deleted == False
         ).first()
     
+    def get_version(self, slug: str):
+        """(id, updated_at) of article follow slug, None if not found (ETag without loading the row)"""
+        return _version_by_slug(self.db, db.News, slug)
+    
+    def get_listing_version(self, category_ids: list[int] | None = None,
+                            featured: bool = False, hot: bool = False) -> tuple:
+        """Version of published articles (count, max updated_at), see _listing_version"""
+        return _listing_version(self.db, db.News, category_ids, featured, hot)
+    
     def get_all(self, limit: int = None, offset: int = 0, 
-                status: db.NewsStatus = None, include_deleted: bool = False) -> List[db.News]:
+                status: db.NewsStatus = None, include_deleted: bool = False,
+                cursor: str = None, listing: bool = False) -> List[db.News]:
         """
         List article
         
@@ -90,11 +472,13 @@ class NewsModel:
             offset: position start
             status: filter status
             include_deleted: If True, get article deleted (for admin)
+            cursor: cursor of next page (keyset pagination, offset is ignored)
+            listing: If True, load only card columns (CARD_COLUMNS)
             
         Returns:
             List of News objects
         """
-        query = self.db.query(db.News)
+        query = _cards(self.db, db.News) if listing else self.db.query(db.News)
         
         if not include_deleted:
             query = query.filter(db.News.is_deleted == False)
@@ -102,12 +486,7 @@ class NewsModel:
         if status:
             query = query.filter(db.News.status == status)
         
-        query = query.order_by(desc(db.News.created_at))
-        
-        if limit:
-            query = query.limit(limit).offset(offset)
-        
-        return query.all()
+        return _paginate(query, db.News, limit, offset, cursor).all()
 
     def get_by_creator(
         self,
@@ -117,6 +496,7 @@ class NewsModel:
         status: db.NewsStatus | None = None,
         search: str | None = None,
         include_deleted: bool = False,
+        total_mode: str = 'exact',
     ) -> tuple[list[db.News], int]:
         """
         List article follow creator (editor), support pagging and search.
@@ -128,6 +508,14 @@ class NewsModel:
             status: Filter status
             search: Keyword / summary
             include_deleted: If True, include article deleted (for admin)
+            total_mode: How total is computed
+                'exact'       - COUNT query then page query (two round trips)
+                'window'      - COUNT(*) OVER () on the page query (one round trip,
+                                needs MySQL 8 / MariaDB 10.2 / SQLite 3.25)
+                'cached'      - exact total cached per (creator, status, search),
+                                dropped on writes of the creator
+                'approximate' - count at most APPROX_TOTAL_CAP + 1 rows, a total
+                                greater than APPROX_TOTAL_CAP means "more than"
 
         Returns:
             (items, total) - list article and total
@@ -149,8 +537,29 @@ class NewsModel:
                 )
             )
 
-        # Tính tổng trước khi limit/offset
-        total = query.count()
+        if total_mode == 'window':
+            page = query.add_columns(func.count().over().label('total'))
+            page = page.order_by(desc(db.News.created_at))
+            if limit:
+                page = page.limit(limit).offset(offset)
+            rows = page.all()
+            if rows or not offset:
+                return [row[0] for row in rows], (rows[0][1] if rows else 0)
+            # page after the last one: no row to carry the total
+            return [], query.count()
+
+        if total_mode == 'cached':
+            key = (creator_id, status, search, include_deleted)
+            total = _creator_totals.get(key)
+            if total is None:
+                total = query.count()
+                _creator_totals.set(key, total)
+        elif total_mode == 'approximate':
+            capped = query.with_entities(db.News.id).limit(APPROX_TOTAL_CAP + 1).subquery()
+            total = self.db.query(func.count()).select_from(capped).scalar()
+        else:
+            # Tính tổng trước khi limit/offset
+            total = query.count()
 
         query = query.order_by(desc(db.News.created_at))
 
@@ -160,72 +569,99 @@ class NewsModel:
         items = query.all()
         return items, total
     
-    def get_published(self, limit: int = None, offset: int = 0) -> List[db.News]:
+    def get_published(self, limit: int = None, offset: int = 0,
+                      cursor: str = None) -> List[db.News]:
         """List article published (just only article don't deleted)"""
         return self.get_all(
             limit=limit, 
             offset=offset, 
-            status=db.NewsStatus.PUBLISHED
+            status=db.NewsStatus.PUBLISHED,
+            cursor=cursor,
+            listing=True
         )
     
     def get_by_category(self, category_id: int, limit: int = None, 
-                       offset: int = 0) -> List[db.News]:
+                       offset: int = 0, cursor: str = None) -> List[db.News]:
         """List article of category (just only article don't deleted)"""
-        query = self.db.query(db.News).filter(
+        query = _cards(self.db, db.News).filter(
             db.News.category_id == category_id,
             db.News.status == db.NewsStatus.PUBLISHED,
             db.News.is_deleted == False
-        ).order_by(desc(db.News.created_at))
-        
-        if limit:
-            query = query.limit(limit).offset(offset)
+        )
         
-        return query.all()
+        return _paginate(query, db.News, limit, offset, cursor).all()
     
     def get_by_categories(
         self,
         category_ids: list[int],
         limit: int | None = None,
         offset: int = 0,
+        cursor: str | None = None,
     ) -> list[db.News]:
         """List article of all child category (just only article don't deleted)"""
         if not category_ids:
             return []
 
-        query = (
-            self.db.query(db.News)
-            .filter(
-                db.News.category_id.in_(category_ids),
-                db.News.status == db.NewsStatus.PUBLISHED,
-                db.News.is_deleted == False,
-            )
-            .order_by(desc(db.News.created_at))
+        query = _cards(self.db, db.News).filter(
+            db.News.category_id.in_(category_ids),
+            db.News.status == db.NewsStatus.PUBLISHED,
+            db.News.is_deleted == False,
         )
 
-        if limit:
-            query = query.limit(limit).offset(offset)
-
-        return query.all()
+        return _paginate(query, db.News, limit, offset, cursor).all()
+    
+    def get_versions_by_categories(self, category_ids: list[int], limit: int | None = None,
+                                   offset: int = 0) -> list[tuple]:
+        """(id, updated_at) of the page of get_by_categories (fragment cache keys)"""
+        return _page_versions(self.db, db.News, category_ids, limit, offset)
     
-    def get_featured(self, limit: int = 10) -> List[db.News]:
+    def get_cards(self, ids: list[int]) -> list[db.News]:
+        """Card columns of published articles, in order of ids"""
+        return _load_in_order(_cards(self.db, db.News), db.News, ids)
+    
+    def get_featured(self, limit: int = 10, offset: int = 0, cursor: str = None) -> List[db.News]:
         """List article is featured (just only article don't deleted)"""
-        return self.db.query(db.News).filter(
+        query = _cards(self.db, db.News).filter(
             db.News.is_featured == True,
             db.News.status == db.NewsStatus.PUBLISHED,
             db.News.is_deleted == False
-        ).order_by(desc(db.News.created_at)).limit(limit).all()
+        )
+        return _paginate(query, db.News, limit, offset, cursor).all()
     
     def get_hot(self, limit: int = 10) -> List[db.News]:
         """List article is hot (just only article don't deleted)"""
-        return self.db.query(db.News).filter(
+        return _cards(self.db, db.News).filter(
             db.News.is_hot == True,
             db.News.status == db.NewsStatus.PUBLISHED,
             db.News.is_deleted == False
         ).order_by(desc(db.News.view_count)).limit(limit).all()
     
-    def search(self, keyword: str, limit: int = 20) -> List[db.News]:
+    def get_top_by_groups(self, groups: dict[int, list[int]],
+                          per_group: int = 5) -> dict[int, list[db.News]]:
+        """Newest article of every group of category in one query, {group id: [News]}"""
+        return _top_per_group(self.db, db.News, groups, per_group)
+    
+    def search(self, keyword: str, limit: int = 20, offset: int = 0) -> List[db.News]:
         """List article by keyword (just only article don't deleted)"""
-        return self.db.query(db.News).filter(
+        return self.search_page(keyword, limit, offset)[0]
+    
+    def search_page(self, keyword: str, limit: int = 20,
+                    offset: int = 0) -> tuple[list[db.News], int]:
+        """
+        Search article by keyword, ranked by relevance (search engine) or
+        newest first (LIKE query when SEARCH_BACKEND is 'database')
+        
+        Returns:
+            (items, total) - list article of page and total
+        """
+        service = search.get_service()
+        found = service.search(self.db, 'news', keyword, limit, offset) if service is not None else None
+        if found is not None:
+            ids, total = found
+            return _load_in_order(_cards(self.db, db.News), db.News, ids), total
+        
+        # LIKE query: SEARCH_BACKEND is 'database' or the index is still being built
+        query = _cards(self.db, db.News).filter(
             or_(
                 db.News.title.ilike(f'%{keyword}%'),
                 db.News.content.ilike(f'%{keyword}%'),
@@ -233,8 +669,11 @@ class NewsModel:
             ),
             db.News.status == db.NewsStatus.PUBLISHED,
             db.News.is_deleted == False
-        ).order_by(desc(db.News.created_at)).limit(limit).all()
+        )
+        total = query.count()
+        return query.order_by(desc(db.News.created_at)).limit(limit).offset(offset).all(), total
     
+    @db.on_primary
     def update(self, news_id: int, **kwargs) -> Optional[db.News]:
         """
         Update article
@@ -249,14 +688,21 @@ class NewsModel:
         news = self.get_by_id(news_id)
         if not news:
             return None
+        tags = response_cache.article_tags('vn', news)
         
         for key, value in kwargs.items():
             if hasattr(news, key):
                 setattr(news, key, value)
+        if 'content' in kwargs:
+            for key, value in excerpts.text_stats(news.content).items():
+                setattr(news, key, value)
         
-        news.updated_at = datetime.utcnow()
+        news.updated_at = datetime.now()
         self.db.commit()
         self.db.refresh(news)
+        search.notify('news', news)
+        _creator_totals.invalidate(news.created_by)
+        response_cache.invalidate(self.db, tags | response_cache.article_tags('vn', news))
         return news
     
     def approve(self, news_id: int, approved_by: int) -> Optional[db.News]:
@@ -268,6 +714,7 @@ class NewsModel:
             published_at=datetime.utcnow()
         )
     
+    @db.on_primary
     def reject(self, news_id: int, approved_by: int, reason: str = None) -> Optional[db.News]:
         """
         Article reject
@@ -295,6 +742,7 @@ class NewsModel:
         
         return result
     
+    @db.on_primary
     def delete(self, news_id: int) -> bool:
         """
         delete article (soft delete) - set is_deleted = True
@@ -302,26 +750,39 @@ class NewsModel:
         news = self.get_by_id(news_id)
         if not news:
             return False
+        tags = response_cache.article_tags('vn', news)
         
         news.is_deleted = True
-        news.updated_at = datetime.utcnow()
+        news.updated_at = datetime.now()
         self.db.commit()
+        search.notify('news', news)
+        _creator_totals.invalidate(news.created_by)
+        response_cache.invalidate(self.db, tags)
         return True
     
     def increment_view(self, news_id: int) -> None:
-        """increase views"""
-        news = self.get_by_id(news_id)
-        if news:
-            news.view_count += 1
-            self.db.commit()
+        """increase views (buffered, written in batch by view_counter)"""
+        view_counter.get_counter().increment('news', news_id)
+    
+    @db.on_primary
+    def bulk_create(self, rows: Iterable[dict], batch_size: int = 500) -> Iterator[dict]:
+        """
+        Import many articles, rows are consumed lazily so memory stay bounded
+
+        Args:
+            rows: iterable of dict of News columns, title, content,
+                  category_id and created_by are required, slug is generated
+                  from title when missing and made unique for the whole batch
+            batch_size: amount rows inserted with one executemany and one commit
+
+        Yields:
+            {'index', 'slug', 'ok', 'error'} for every row, in input order
+        """
+        return _bulk_create(self.db, db.News, rows, batch_size)
     
     def _generate_slug(self, title: str) -> str:
         """create slug from title"""
-        import re
-        slug = title.lower()
-        slug = re.sub(r'[^\w\s-]', '', slug)
-        slug = re.sub(r'[-\s]+', '-', slug)
-        return slug.strip('-')
+        return _slugify(title)
 
 
 class CategoryModel:
@@ -330,6 +791,7 @@ class CategoryModel:
     def __init__(self, db_session: Session):
         self.db = db_session
     
+    @db.on_primary
     def create(self, name: str, slug: str, parent_id: int = None, 
                description: str = None, icon: str = None) -> db.Category:
         """Create category"""
@@ -343,6 +805,25 @@ class CategoryModel:
         self.db.add(category)
         self.db.commit()
         self.db.refresh(category)
+        category_tree.invalidate(self.db, 'vn')
+        response_cache.invalidate(self.db, [response_cache.categories_tag('vn')])
+        return category
+    
+    @db.on_primary
+    def update(self, category_id: int, **kwargs) -> Optional[db.Category]:
+        """Update category"""
+        category = self.get_by_id(category_id)
+        if not category:
+            return None
+        
+        for key, value in kwargs.items():
+            if hasattr(category, key):
+                setattr(category, key, value)
+        
+        self.db.commit()
+        self.db.refresh(category)
+        category_tree.invalidate(self.db, 'vn')
+        response_cache.invalidate_categories(self.db, 'vn')
         return category
     
     def get_all(self) -> List[db.Category]:
@@ -359,22 +840,25 @@ class CategoryModel:
         """Get category by slug"""
         return self.db.query(db.Category).filter(db.Category.slug == slug).first()
 
+    def get_tree(self) -> category_tree.CategoryTree:
+        """Cached tree of visible category"""
+        return category_tree.get_tree(self.db, 'vn')
+
+    def get_tree_version(self) -> str | None:
+        """Version stamp of category tree, changes with every category write"""
+        return category_tree.get_version(self.db, 'vn')
+
     def get_descendant_ids(self, parent_id: int) -> list[int]:
         """List id category child (all level) of parent_id."""
-        categories = self.db.query(db.Category.id, db.Category.parent_id).filter(
-            db.Category.visible == True
-        ).all()
+        return self.get_tree().descendant_ids(parent_id)
 
-        children = []
-        stack = [parent_id]
-        while stack:
-            current = stack.pop()
-            for cat_id, cat_parent in categories:
-                if cat_parent == current:
-                    children.append(cat_id)
-                    stack.append(cat_id)
+    def get_breadcrumbs(self, category_id: int) -> list[category_tree.CategoryNode]:
+        """List category from top level to category_id"""
+        return self.get_tree().breadcrumbs(category_id)
 
-        return children
+    def get_menu(self) -> list[tuple[category_tree.CategoryNode, tuple]]:
+        """Menu [(top level category, children)] order by order_display"""
+        return self.get_tree().menu()
 
 
 class UserModel:
@@ -395,6 +879,7 @@ class UserModel:
         """Get user follow ID"""
         return self.db.query(db.User).filter(db.User.id == user_id).first()
     
+    @db.on_primary
     def create(self, username: str, email: str, password: str, 
                full_name: str = None, phone: str = None, 
                role: db.UserRole = db.UserRole.USER) -> db.User:
@@ -508,12 +993,23 @@ class InternationalNewsModel:
             .first()
         )
 
+    def get_version(self, slug: str):
+        """(id, updated_at) của bài viết theo slug, None nếu không có (ETag không cần tải cả dòng)"""
+        return _version_by_slug(self.db, db.NewsInternational, slug)
+
+    def get_listing_version(self, category_ids: list[int] | None = None,
+                            featured: bool = False, hot: bool = False) -> tuple:
+        """Phiên bản của danh sách bài đã đăng (count, max updated_at), xem _listing_version"""
+        return _listing_version(self.db, db.NewsInternational, category_ids, featured, hot)
+
     def get_all(
         self,
         limit: int | None = None,
         offset: int = 0,
         status: db.NewsStatus | None = None,
         include_deleted: bool = False,
+        cursor: str | None = None,
+        listing: bool = False,
     ) -> list[db.NewsInternational]:
         """
         Lấy danh sách bài viết quốc tế
@@ -523,8 +1019,13 @@ class InternationalNewsModel:
             offset: Vị trí bắt đầu
             status: Lọc theo trạng thái
             include_deleted: Nếu True, lấy cả bài đã xóa (cho admin)
+            cursor: Cursor của trang kế tiếp (keyset pagination, bỏ qua offset)
+            listing: Nếu True, chỉ tải các cột của thẻ bài viết (CARD_COLUMNS)
         """
-        query = self.db.query(db.NewsInternational)
+        query = (
+            _cards(self.db, db.NewsInternational) if listing
+            else self.db.query(db.NewsInternational)
+        )
 
         if not include_deleted:
             query = query.filter(db.NewsInternational.is_deleted == False)
@@ -532,41 +1033,35 @@ class InternationalNewsModel:
         if status:
             query = query.filter(db.NewsInternational.status == status)
 
-        query = query.order_by(db.NewsInternational.created_at.desc())
-
-        if limit:
-            query = query.limit(limit).offset(offset)
-
-        return query.all()
+        return _paginate(query, db.NewsInternational, limit, offset, cursor).all()
 
     def get_published(
-        self, limit: int | None = None, offset: int = 0
+        self, limit: int | None = None, offset: int = 0, cursor: str | None = None
     ) -> list[db.NewsInternational]:
         """Lấy danh sách bài viết quốc tế đã xuất bản (chỉ lấy bài chưa bị xóa)"""
         return self.get_all(
             limit=limit,
             offset=offset,
             status=db.NewsStatus.PUBLISHED,
+            cursor=cursor,
+            listing=True,
         )
 
-    def get_featured(self, limit: int = 10) -> list[db.NewsInternational]:
+    def get_featured(
+        self, limit: int = 10, offset: int = 0, cursor: str | None = None
+    ) -> list[db.NewsInternational]:
         """Lấy bài viết quốc tế nổi bật (chỉ lấy bài chưa bị xóa)"""
-        return (
-            self.db.query(db.NewsInternational)
-            .filter(
-                db.NewsInternational.is_featured.is_(True),
-                db.NewsInternational.status == db.NewsStatus.PUBLISHED,
-                db.NewsInternational.is_deleted == False,
-            )
-            .order_by(db.NewsInternational.created_at.desc())
-            .limit(limit)
-            .all()
+        query = _cards(self.db, db.NewsInternational).filter(
+            db.NewsInternational.is_featured.is_(True),
+            db.NewsInternational.status == db.NewsStatus.PUBLISHED,
+            db.NewsInternational.is_deleted == False,
         )
+        return _paginate(query, db.NewsInternational, limit, offset, cursor).all()
 
     def get_hot(self, limit: int = 10) -> list[db.NewsInternational]:
         """Lấy tin quốc tế nóng nhất (chỉ lấy bài chưa bị xóa)"""
         return (
-            self.db.query(db.NewsInternational)
+            _cards(self.db, db.NewsInternational)
             .filter(
                 db.NewsInternational.is_hot.is_(True),
                 db.NewsInternational.status == db.NewsStatus.PUBLISHED,
@@ -578,24 +1073,101 @@ class InternationalNewsModel:
         )
 
     def get_by_category(
-        self, category_id: int, limit: int | None = None, offset: int = 0
+        self,
+        category_id: int,
+        limit: int | None = None,
+        offset: int = 0,
+        cursor: str | None = None,
     ) -> list[db.NewsInternational]:
         """Lấy bài viết quốc tế theo danh mục (chỉ lấy bài chưa bị xóa)"""
-        query = (
-            self.db.query(db.NewsInternational)
-            .filter(
-                db.NewsInternational.category_id == category_id,
-                db.NewsInternational.status == db.NewsStatus.PUBLISHED,
-                db.NewsInternational.is_deleted == False,
-            )
-            .order_by(db.NewsInternational.created_at.desc())
+        query = _cards(self.db, db.NewsInternational).filter(
+            db.NewsInternational.category_id == category_id,
+            db.NewsInternational.status == db.NewsStatus.PUBLISHED,
+            db.NewsInternational.is_deleted == False,
         )
 
-        if limit:
-            query = query.limit(limit).offset(offset)
+        return _paginate(query, db.NewsInternational, limit, offset, cursor).all()
+
+    def get_by_categories(
+        self,
+        category_ids: list[int],
+        limit: int | None = None,
+        offset: int = 0,
+        cursor: str | None = None,
+    ) -> list[db.NewsInternational]:
+        """Lấy bài viết quốc tế của tất cả danh mục con (chỉ lấy bài chưa bị xóa)"""
+        if not category_ids:
+            return []
+
+        query = _cards(self.db, db.NewsInternational).filter(
+            db.NewsInternational.category_id.in_(category_ids),
+            db.NewsInternational.status == db.NewsStatus.PUBLISHED,
+            db.NewsInternational.is_deleted == False,
+        )
 
-        return query.all()
+        return _paginate(query, db.NewsInternational, limit, offset, cursor).all()
 
+    def get_versions_by_categories(self, category_ids: list[int], limit: int | None = None,
+                                   offset: int = 0) -> list[tuple]:
+        """(id, updated_at) của một trang get_by_categories (khóa của fragment cache)"""
+        return _page_versions(self.db, db.NewsInternational, category_ids, limit, offset)
+
+    def get_cards(self, ids: list[int]) -> list[db.NewsInternational]:
+        """Các cột của thẻ bài viết đã đăng, theo thứ tự của ids"""
+        return _load_in_order(_cards(self.db, db.NewsInternational), db.NewsInternational, ids)
+
+    def get_top_by_groups(
+        self, groups: dict[int, list[int]], per_group: int = 5
+    ) -> dict[int, list[db.NewsInternational]]:
+        """Bài mới nhất của từng nhóm danh mục trong một truy vấn, {id nhóm: [NewsInternational]}"""
+        return _top_per_group(self.db, db.NewsInternational, groups, per_group)
+
+    def search(
+        self, keyword: str, limit: int = 20, offset: int = 0
+    ) -> list[db.NewsInternational]:
+        """Tìm bài viết quốc tế theo từ khóa (chỉ lấy bài chưa bị xóa)"""
+        return self.search_page(keyword, limit, offset)[0]
+
+    def search_page(
+        self, keyword: str, limit: int = 20, offset: int = 0
+    ) -> tuple[list[db.NewsInternational], int]:
+        """
+        Tìm bài viết quốc tế theo từ khóa, có phân trang
+
+        Returns:
+            (items, total) - danh sách bài viết của trang và tổng số kết quả
+        """
+        service = search.get_service()
+        found = (
+            service.search(self.db, 'news_international', keyword, limit, offset)
+            if service is not None else None
+        )
+        if found is not None:
+            ids, total = found
+            query = _cards(self.db, db.NewsInternational)
+            return _load_in_order(query, db.NewsInternational, ids), total
+
+        # Truy vấn LIKE: SEARCH_BACKEND là 'database' hoặc chỉ mục đang được xây dựng
+
+        query = _cards(self.db, db.NewsInternational).filter(
+            or_(
+                db.NewsInternational.title.ilike(f'%{keyword}%'),
+                db.NewsInternational.content.ilike(f'%{keyword}%'),
+                db.NewsInternational.summary.ilike(f'%{keyword}%'),
+            ),
+            db.NewsInternational.status == db.NewsStatus.PUBLISHED,
+            db.NewsInternational.is_deleted == False,
+        )
+        total = query.count()
+        items = (
+            query.order_by(db.NewsInternational.created_at.desc())
+            .limit(limit)
+            .offset(offset)
+            .all()
+        )
+        return items, total
+
+    @db.on_primary
     def update(self, news_id: int, **kwargs) -> Optional[db.NewsInternational]:
         """
         Cập nhật bài viết quốc tế
@@ -610,14 +1182,20 @@ class InternationalNewsModel:
         news = self.get_by_id(news_id)
         if not news:
             return None
+        tags = response_cache.article_tags('en', news)
         
         for key, value in kwargs.items():
             if hasattr(news, key):
                 setattr(news, key, value)
+        if 'content' in kwargs:
+            for key, value in excerpts.text_stats(news.content).items():
+                setattr(news, key, value)
         
-        news.updated_at = datetime.utcnow()
+        news.updated_at = datetime.now()
         self.db.commit()
         self.db.refresh(news)
+        search.notify('news_international', news)
+        response_cache.invalidate(self.db, tags | response_cache.article_tags('en', news))
         return news
 
     def approve(self, news_id: int, approved_by: int) -> Optional[db.NewsInternational]:
@@ -629,6 +1207,7 @@ class InternationalNewsModel:
             published_at=datetime.utcnow()
         )
     
+    @db.on_primary
     def reject(self, news_id: int, approved_by: int, reason: str = None) -> Optional[db.NewsInternational]:
         """
         Từ chối bài viết quốc tế
@@ -656,6 +1235,20 @@ class InternationalNewsModel:
         
         return result
 
+    @db.on_primary
+    def bulk_create(self, rows: Iterable[dict], batch_size: int = 500) -> Iterator[dict]:
+        """
+        Nhập nhiều bài viết quốc tế theo lô (xem NewsModel.bulk_create)
+
+        Yields:
+            {'index', 'slug', 'ok', 'error'} cho từng dòng, theo thứ tự đầu vào
+        """
+        return _bulk_create(self.db, db.NewsInternational, rows, batch_size)
+
+    def increment_view(self, news_id: int) -> None:
+        """Tăng lượt xem (gom trong bộ đệm, ghi theo lô bởi view_counter)"""
+        view_counter.get_counter().increment('news_international', news_id)
+
 
 class InternationalCategoryModel:
     """Model class quản lý CategoryInternational (danh mục tin quốc tế)"""
@@ -686,4 +1279,65 @@ class InternationalCategoryModel:
             self.db.query(db.CategoryInternational)
             .filter(db.CategoryInternational.slug == slug)
             .first()
-        )
\ No newline at end of file
+        )
+
+    @db.on_primary
+    def create(
+        self,
+        name: str,
+        slug: str,
+        parent_id: int | None = None,
+        description: str | None = None,
+        icon: str | None = None,
+    ) -> db.CategoryInternational:
+        """Tạo danh mục quốc tế"""
+        category = db.CategoryInternational(
+            name=name,
+            slug=slug,
+            parent_id=parent_id,
+            description=description,
+            icon=icon,
+        )
+        self.db.add(category)
+        self.db.commit()
+        self.db.refresh(category)
+        category_tree.invalidate(self.db, 'en')
+        response_cache.invalidate(self.db, [response_cache.categories_tag('en')])
+        return category
+
+    @db.on_primary
+    def update(self, category_id: int, **kwargs) -> Optional[db.CategoryInternational]:
+        """Cập nhật danh mục quốc tế"""
+        category = self.get_by_id(category_id)
+        if not category:
+            return None
+
+        for key, value in kwargs.items():
+            if hasattr(category, key):
+                setattr(category, key, value)
+
+        self.db.commit()
+        self.db.refresh(category)
+        category_tree.invalidate(self.db, 'en')
+        response_cache.invalidate_categories(self.db, 'en')
+        return category
+
+    def get_tree(self) -> category_tree.CategoryTree:
+        """Cây danh mục quốc tế đang hiển thị (có cache)"""
+        return category_tree.get_tree(self.db, 'en')
+
+    def get_tree_version(self) -> str | None:
+        """Phiên bản của cây danh mục, thay đổi sau mỗi lần ghi danh mục"""
+        return category_tree.get_version(self.db, 'en')
+
+    def get_descendant_ids(self, parent_id: int) -> list[int]:
+        """Lấy id các danh mục con (mọi cấp) của parent_id"""
+        return self.get_tree().descendant_ids(parent_id)
+
+    def get_breadcrumbs(self, category_id: int) -> list[category_tree.CategoryNode]:
+        """Danh sách danh mục từ cấp cao nhất đến category_id"""
+        return self.get_tree().breadcrumbs(category_id)
+
+    def get_menu(self) -> list[tuple[category_tree.CategoryNode, tuple]]:
+        """Menu [(danh mục cấp 1, danh mục con)] sắp xếp theo order_display"""
+        return self.get_tree().menu()
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Request scoped database session
+
+One session per request stored in flask.g, opened on first use. At the
+end of the request (teardown of the request, of the app context outside
+requests) it is committed, or rolled back if the request failed, and
+always closed so its connection returns to the pool.
+
+With read replicas, a client whose request wrote keeps reading from the
+primary for DB_READ_YOUR_WRITES_SECONDS (timestamp in its flask session),
+so an editor sees the article just saved even if replicas lag.
+"""
+import logging
+import time
+
+from flask import g, session as flask_session
+
+import database as db
+from config import envConfig as ecf
+
+
+logger = logging.getLogger(__name__)
+
+# key of the flask session: time until which reads of the client go to the primary
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+
+
+def get_session():
+    """Session of the current request, opened on first call"""
+    if 'db_session' not in g:
+        g.db_session = db.get_session()
+        if flask_session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            g.db_session.use_primary()
+    return g.db_session
+
+
+def _remember_writes(response):
+    session = g.get('db_session')
+    if session is not None and session.wrote and db.has_replicas():
+        flask_session[PRIMARY_UNTIL_KEY] = time.time() + ecf.DB_READ_YOUR_WRITES_SECONDS
+    return response
+
+
+def _teardown(error=None) -> None:
+    session = g.pop('db_session', None)
+    if session is None:
+        return
+    try:
+        if error is None:
+            session.commit()
+        else:
+            session.rollback()
+    except Exception:
+        logger.exception('Commit of request session failed')
+        session.rollback()
+    finally:
+        session.close()
+
+
+def init_app(app) -> None:
+    """Close the session of every request"""
+    app.after_request(_remember_writes)
+    # in the request context: statements of the commit belong to the request (sql_profiler)
+    app.teardown_request(_teardown)
+    app.teardown_appcontext(_teardown)
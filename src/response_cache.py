@@ -0,0 +1,440 @@
+"""
+Response cache - TTL + LRU cache of the public JSON endpoints
+
+Entries are tagged with the articles they contain ('news:vn:12'), the
+categories they list ('category:vn:3') and the site wide listings they
+belong to ('listing:vn:latest'). Model write methods (approve, reject,
+update, delete...) drop the entries of the article before and after the
+write; the tags go through a log in table settings that every worker reads
+at most every RESPONSE_CACHE_CHECK_INTERVAL seconds, so other workers stop
+serving them too.
+
+A missing entry is computed by one caller only (single_flight), concurrent
+callers of the same key, in this process or other processes of the host,
+wait for its result. An expired entry is still served for stale_ttl seconds
+while one caller recomputes it (stale-while-revalidate).
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, session
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from config import envConfig as ecf
+import conditional
+import database as db
+import request_session
+import serializer
+import single_flight
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Thread safe TTL cache bounded by amount of entries (least recently used evicted)"""
+
+    def __init__(self, name: str, ttl: float = 30, max_entries: int = 1000,
+                 stale_ttl: float = 0, flight: single_flight.SingleFlight | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.flight = flight or single_flight.SingleFlight()
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, tags)
+        self._entries = OrderedDict()
+        # tag -> keys
+        self._tags = {}
+        # bumped by every invalidation, a value computed across one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _lookup(self, key):
+        """(value, fresh) of key, (None, False) if missing or expired past stale_ttl"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            now = time.monotonic()
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0], True
+            if entry[1] + self.stale_ttl > now:
+                return entry[0], False
+            self._delete(key)
+            return None, False
+
+    def get(self, key):
+        """Value of key, None if missing or expired"""
+        value, fresh = self._lookup(key)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def set(self, key, value, tags=(), ttl: float | None = None, generation: int | None = None) -> None:
+        """Store value of key, tags is a list or a function returning the tags of value"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        if callable(tags):
+            tags = tags(value)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # invalidated while value was computed, it may predate the write
+                return
+            if key in self._entries:
+                self._delete(key)
+            self._entries[key] = (value, expires_at, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._delete(oldest)
+                self.evictions += 1
+
+    def fetch(self, key, build, tags=()):
+        """
+        Value of key, build and store it on miss
+
+        Returns:
+            (value, status): status is 'HIT', 'STALE' (expired value served
+            while another caller rebuilds it), 'REVALIDATED' (this caller
+            rebuilt an expired value), 'COALESCED' (value built by a
+            concurrent caller) or 'MISS'. value is None when build returned None
+        """
+        value, fresh = self._lookup(key)
+        if fresh:
+            with self._lock:
+                self.hits += 1
+            return value, 'HIT'
+
+        generation = self._generation
+        built = []
+
+        def compute():
+            result = build()
+            built.append(result)
+            if result is not None:
+                self.set(key, result, tags, generation=generation)
+            return result
+
+        if value is not None:
+            # stale: rebuild by one caller only, the others serve the stale value
+            result = self.flight.do((self.name, key), compute, wait=False)
+            if not built:
+                with self._lock:
+                    self.stale_hits += 1
+                return value, 'STALE'
+            with self._lock:
+                self.misses += 1
+            return result, 'REVALIDATED'
+
+        with self._lock:
+            self.misses += 1
+        result = self.flight.do((self.name, key), compute)
+        if built:
+            return result, 'MISS'
+        # built by another thread or process
+        if result is not None:
+            self.set(key, result, tags, generation=generation)
+        return result, 'COALESCED'
+
+    def get_or_set(self, key, build, tags=()):
+        """Value of key, build and store it on miss"""
+        return self.fetch(key, build, tags)[0]
+
+    def _delete(self, key) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Drop every entry tagged tag, return amount dropped"""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                if key in self._entries:
+                    self._delete(key)
+            self._generation += 1
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+responses = ResponseCache('responses', ttl=ecf.RESPONSE_CACHE_TTL, max_entries=ecf.RESPONSE_CACHE_MAX_ENTRIES,
+                          stale_ttl=ecf.RESPONSE_CACHE_STALE_TTL, flight=single_flight.get_flight())
+
+# rendered HTML of article bodies and cards
+fragments = ResponseCache('fragments', ttl=ecf.FRAGMENT_CACHE_TTL, max_entries=ecf.FRAGMENT_CACHE_MAX_ENTRIES,
+                          flight=single_flight.get_flight())
+
+# every cache of the process by name (statistics)
+caches = {responses.name: responses, fragments.name: fragments}
+
+
+def site_tag(site: str) -> str:
+    """Every entry of site"""
+    return f'site:{site}'
+
+
+def categories_tag(site: str) -> str:
+    """Lists of categories of site"""
+    return f'categories:{site}'
+
+
+def category_tag(site: str, category_id: int) -> str:
+    """Listings of the articles of a category"""
+    return f'category:{site}:{category_id}'
+
+
+def listing_tag(site: str, name: str) -> str:
+    """Site wide listings: 'latest', 'featured', 'hot'"""
+    return f'listing:{site}:{name}'
+
+
+def news_tag(site: str, news_id: int) -> str:
+    """Entries containing an article"""
+    return f'news:{site}:{news_id}'
+
+
+def news_tags(site: str, items) -> list[str]:
+    return [news_tag(site, news.id) for news in items]
+
+
+def article_tags(site: str, news) -> set[str]:
+    """
+    Tags of the entries an article is part of, or would be part of once
+    written; call it before and after a write and invalidate both
+    """
+    tags = {news_tag(site, news.id)} if news.id is not None else set()
+    if news.status == db.NewsStatus.PUBLISHED and not news.is_deleted:
+        tags.add(category_tag(site, news.category_id))
+        tags.add(listing_tag(site, 'latest'))
+        if news.is_featured:
+            tags.add(listing_tag(site, 'featured'))
+        if news.is_hot:
+            tags.add(listing_tag(site, 'hot'))
+    return tags
+
+
+class InvalidationLog:
+    """
+    Invalidations of every worker, shared through one row of table settings
+
+    The row holds a sequence number and the tags of the last max_events
+    invalidations. A writer appends its tags (compare and swap on the
+    value, no lost update between concurrent writers) and drops them
+    locally; every worker reads the row at most every check_interval
+    seconds and drops the tags invalidated by others since its last read.
+    A worker that fell behind the log drops everything.
+    """
+
+    KEY = 'response_cache_invalidations'
+
+    def __init__(self, cache: ResponseCache, check_interval: float = 2, max_events: int = 100,
+                 max_tags: int = 50):
+        self.cache = cache
+        self.check_interval = check_interval
+        self.max_events = max_events
+        self.max_tags = max_tags
+        self._lock = threading.Lock()
+        self._seq = None
+        self._checked_at = 0.0
+        # sequence numbers written by this process, already applied
+        self._own = set()
+
+    def _read(self, session) -> tuple[str | None, int, list]:
+        raw = session.query(db.Setting.value).filter(db.Setting.key == self.KEY).scalar()
+        if not raw:
+            return raw, 0, []
+        try:
+            data = json.loads(raw)
+            return raw, int(data['seq']), data['events']
+        except (ValueError, KeyError, TypeError):
+            return raw, 0, []
+
+    def publish(self, session, tags) -> None:
+        """Drop tags here and in every other worker (commits session)"""
+        tags = sorted(set(tags))
+        if not tags:
+            return
+        for tag in tags:
+            self.cache.invalidate_tag(tag)
+        if len(tags) > self.max_tags:
+            # bulk write: cheaper to drop the whole site(s) than to log every tag
+            tags = sorted({site_tag(tag.split(':')[1]) for tag in tags if tag.count(':') >= 1})
+
+        for attempt in range(5):
+            raw, seq, events = self._read(session)
+            events = (events + [[seq + 1, tags]])[-self.max_events:]
+            value = json.dumps({'seq': seq + 1, 'events': events}, separators=(',', ':'))
+            try:
+                if raw is None:
+                    session.add(db.Setting(key=self.KEY, value=value, category='cache',
+                                           description='Recent invalidations of the response cache'))
+                    session.flush()
+                    written = 1
+                else:
+                    written = session.execute(
+                        update(db.Setting)
+                        .where(db.Setting.key == self.KEY, db.Setting.value == raw)
+                        .values(value=value, updated_at=datetime.datetime.now())
+                    ).rowcount
+                session.commit()
+            except IntegrityError:
+                # row created by another worker meanwhile
+                session.rollback()
+                continue
+            if written:
+                with self._lock:
+                    self._own.add(seq + 1)
+                return
+        logger.warning('Cannot publish invalidation of %s, other workers serve it until TTL', tags)
+
+    def sync(self, session) -> None:
+        """Drop the tags invalidated by other workers since the last read"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            _, seq, events = self._read(session)
+        except SQLAlchemyError:
+            logger.exception('Cannot read invalidations of response cache')
+            return
+
+        with self._lock:
+            last, self._seq = self._seq, seq
+            if last is None or seq == last:
+                return
+            if seq < last or not events or events[0][0] > last + 1:
+                # log reset or events missed: anything cached may be stale
+                self.cache.clear()
+                self._own.clear()
+                return
+            for event_seq, tags in events:
+                if event_seq <= last:
+                    continue
+                if event_seq in self._own:
+                    self._own.discard(event_seq)
+                    continue
+                for tag in tags:
+                    self.cache.invalidate_tag(tag)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._seq = None
+            self._checked_at = 0.0
+            self._own.clear()
+
+
+invalidations = InvalidationLog(responses, check_interval=ecf.RESPONSE_CACHE_CHECK_INTERVAL)
+
+
+def invalidate(session, tags) -> None:
+    """Articles or categories changed: drop the entries of tags in every worker"""
+    invalidations.publish(session, tags)
+
+
+def invalidate_categories(session, site: str) -> None:
+    """Categories of site changed, names and slugs are part of every entry"""
+    invalidations.publish(session, [site_tag(site)])
+
+
+def fragment_key(kind: str, site: str, news_id: int, updated_at) -> tuple:
+    """
+    Key of a rendered fragment of an article, an edit (new updated_at)
+    makes a new key. Language of the reader is part of it, template
+    filters format dates by session['site'].
+    """
+    return (kind, site, session.get('site'), news_id, updated_at)
+
+
+def request_key(site: str) -> tuple:
+    """(endpoint, site, query arguments: limit, cursor, offset...) of current request"""
+    args = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != 'site'))
+    return (request.endpoint, site, args)
+
+
+def cached_json(site: str, build, tags=()):
+    """
+    Response of current JSON endpoint from cache, build it on miss
+
+    The body is cached with its ETag (hash of the body), a client sending
+    it back in If-None-Match gets a 304 without the body.
+
+    Args:
+        build: function(tags) returning the JSON body (bytes), or a response
+               which is returned as is and not cached (errors); it adds
+               to tags the articles and categories the body depends on
+        tags: tags of the entry known before building it
+    """
+    errors = []
+    invalidations.sync(request_session.get_session())
+
+    def build_body():
+        entry_tags = [site_tag(site), *tags]
+        body = build(entry_tags)
+        if isinstance(body, bytes):
+            return body, conditional.make_etag(body), tuple(entry_tags)
+        errors.append(body)
+        return None
+
+    entry, status = responses.fetch(request_key(site), build_body, lambda entry: entry[2])
+    if errors:
+        return errors[0]
+    if entry is None:
+        # another caller failed to build the body, build ours
+        entry = build_body()
+        if errors:
+            return errors[0]
+
+    body, etag, _ = entry
+    if conditional.is_not_modified(etag):
+        response = conditional.not_modified(etag)
+    else:
+        response = conditional.set_validators(serializer.json_response(body), etag)
+    response.headers['X-Cache'] = status
+    return response
+
+
+def stats() -> dict:
+    data = {name: cache.stats() for name, cache in caches.items()}
+    data['single_flight'] = single_flight.get_flight().stats()
+    return data
@@ -0,0 +1,383 @@
+"""
+Search engine for news - inverted index with diacritic folding and BM25 ranking
+
+The index lives in process memory and is built from the database by a
+background thread started with the app; until it is ready searches use the
+LIKE query. NewsModel / InternationalNewsModel push their writes to it, and
+every SEARCH_REFRESH_INTERVAL seconds it pulls rows added or changed by other
+workers (id above the highest seen, updated_at after the watermark), so no
+external search server is needed. Only postings are kept, not the text.
+"""
+import abc
+import bisect
+import datetime
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from sqlalchemy import or_
+
+from config import envConfig as ecf
+import database as db
+
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_ENTITY_RE = re.compile(r'&[a-zA-Z]+;|&#\d+;')
+_TOKEN_RE = re.compile(r'\w+')
+
+# weight of term frequency per field (title match rank above content match)
+FIELD_WEIGHTS = {'title': 3, 'summary': 2, 'content': 1}
+
+# search entity by kind
+KINDS = {
+    'news': db.News,
+    'news_international': db.NewsInternational,
+}
+
+
+def fold(text: str) -> str:
+    """Lower case and remove diacritics: 'Hà Nội' -> 'ha noi'"""
+    text = text.lower().replace('đ', 'd')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Split text (HTML allowed) into folded tokens"""
+    if not text:
+        return []
+    text = _ENTITY_RE.sub(' ', _TAG_RE.sub(' ', text))
+    return _TOKEN_RE.findall(fold(text))
+
+
+class SearchBackend(abc.ABC):
+    """Interface of search backend, one index per kind"""
+
+    @abc.abstractmethod
+    def add(self, kind: str, doc_id: int, fields: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    def remove(self, kind: str, doc_id: int) -> None:
+        ...
+
+    @abc.abstractmethod
+    def search(self, kind: str, query: str, limit: int = 20, offset: int = 0) -> tuple[list[int], int]:
+        """Return (ids of one page ranked by relevance, total matches)"""
+
+    @abc.abstractmethod
+    def clear(self, kind: str) -> None:
+        ...
+
+
+class InvertedIndex(SearchBackend):
+    """In-memory inverted index ranked with Okapi BM25"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_prefix_terms: int = 50):
+        self.k1 = k1
+        self.b = b
+        self.max_prefix_terms = max_prefix_terms
+        self._lock = threading.RLock()
+        # kind -> term -> {doc_id: weighted tf}
+        self._postings = defaultdict(lambda: defaultdict(dict))
+        # kind -> doc_id -> (length, terms)
+        self._docs = defaultdict(dict)
+        self._total_length = defaultdict(int)
+        # kind -> sorted vocabulary, rebuilt lazily for prefix lookup
+        self._vocabulary = {}
+
+    def add(self, kind, doc_id, fields):
+        counts = Counter()
+        length = 0
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(fields.get(field))
+            length += len(tokens)
+            for token in tokens:
+                counts[token] += weight
+
+        with self._lock:
+            self._remove(kind, doc_id)
+            if not counts:
+                return
+            postings = self._postings[kind]
+            for term, tf in counts.items():
+                if term not in postings:
+                    self._vocabulary.pop(kind, None)
+                postings[term][doc_id] = tf
+            self._docs[kind][doc_id] = (length, tuple(counts))
+            self._total_length[kind] += length
+
+    def remove(self, kind, doc_id):
+        with self._lock:
+            self._remove(kind, doc_id)
+
+    def _remove(self, kind, doc_id):
+        doc = self._docs[kind].pop(doc_id, None)
+        if doc is None:
+            return
+        length, terms = doc
+        self._total_length[kind] -= length
+        postings = self._postings[kind]
+        for term in terms:
+            docs = postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del postings[term]
+                    self._vocabulary.pop(kind, None)
+
+    def clear(self, kind):
+        with self._lock:
+            self._postings.pop(kind, None)
+            self._docs.pop(kind, None)
+            self._total_length.pop(kind, None)
+            self._vocabulary.pop(kind, None)
+
+    def _expand(self, kind, token, is_last):
+        """Terms matching one query token, the last token also match as prefix (search while typing)"""
+        postings = self._postings[kind]
+        if not is_last or len(token) < 2:
+            return [token] if token in postings else []
+
+        vocabulary = self._vocabulary.get(kind)
+        if vocabulary is None:
+            vocabulary = self._vocabulary[kind] = sorted(postings)
+        start = bisect.bisect_left(vocabulary, token)
+        terms = []
+        for term in vocabulary[start:start + self.max_prefix_terms]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, kind, query, limit=20, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return [], 0
+
+        with self._lock:
+            docs = self._docs[kind]
+            if not docs:
+                return [], 0
+            postings = self._postings[kind]
+            amount = len(docs)
+            avg_length = self._total_length[kind] / amount
+
+            scores = defaultdict(float)
+            for position, token in enumerate(dict.fromkeys(tokens)):
+                for term in self._expand(kind, token, position == len(tokens) - 1):
+                    matches = postings[term]
+                    idf = math.log(1 + (amount - len(matches) + 0.5) / (len(matches) + 0.5))
+                    for doc_id, tf in matches.items():
+                        norm = self.k1 * (1 - self.b + self.b * docs[doc_id][0] / avg_length)
+                        scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [doc_id for doc_id, _ in ranked[offset:offset + limit]], len(ranked)
+
+
+class SearchService:
+    """Keep the search backend in sync with tables news / news_international"""
+
+    # rows changed are detected by updated_at, look back far enough to cover
+    # writers that store local time and writers that store UTC
+    LOOKBACK = datetime.timedelta(days=1)
+    BATCH_SIZE = 1000
+
+    def __init__(self, backend: SearchBackend, refresh_interval: int = 30):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+        # held only to update the index and its bookkeeping, never during a query
+        self._lock = threading.RLock()
+        # one refresh at a time, searches meanwhile use the index as it is
+        self._refresh_lock = threading.Lock()
+        # kind -> doc_id -> updated_at seen, set once the kind is fully built
+        self._versions = {}
+        self._watermark = {}
+        self._max_id = {}
+        self._refreshed_at = {}
+        self._builders = {}
+        self._build_failed_at = {}
+
+    def is_built(self, kind: str) -> bool:
+        return kind in self._versions
+
+    def _columns(self, entity):
+        return (entity.id, entity.title, entity.summary, entity.content,
+                entity.status, entity.is_deleted, entity.updated_at)
+
+    def _apply(self, kind, row, versions) -> None:
+        doc_id, title, summary, content, status, is_deleted, updated_at = row
+        if status == db.NewsStatus.PUBLISHED and not is_deleted:
+            self.backend.add(kind, doc_id, {'title': title, 'summary': summary, 'content': content})
+        else:
+            self.backend.remove(kind, doc_id)
+        versions[doc_id] = updated_at
+
+    def _advance(self, kind, doc_id, updated_at) -> None:
+        """Move the watermark (updated_at) and the highest id seen of kind"""
+        if updated_at and (self._watermark.get(kind) is None or updated_at > self._watermark[kind]):
+            self._watermark[kind] = updated_at
+        if doc_id > self._max_id.get(kind, 0):
+            self._max_id[kind] = doc_id
+
+    def build(self, session, kind: str) -> None:
+        """
+        (Re)build the index of kind from database; searches of kind fall back
+        to the LIKE query until it is done
+        """
+        entity = KINDS[kind]
+        with self._lock:
+            self._versions.pop(kind, None)
+            self._watermark.pop(kind, None)
+            self._max_id.pop(kind, None)
+            self.backend.clear(kind)
+
+        versions = {}
+        rows = session.query(*self._columns(entity)).execution_options(yield_per=self.BATCH_SIZE)
+        for row in rows:
+            with self._lock:
+                self._apply(kind, row, versions)
+                self._advance(kind, row[0], row[-1])
+
+        with self._lock:
+            self._versions[kind] = versions
+            self._refreshed_at[kind] = time.monotonic()
+        logger.info('Search index of %s built, %d articles', kind, len(versions))
+
+    def _build_in_background(self, kind: str) -> None:
+        session = db.get_session()
+        try:
+            self.build(session, kind)
+        except Exception:
+            self._build_failed_at[kind] = time.monotonic()
+            logger.exception('Cannot build search index of %s', kind)
+        finally:
+            session.close()
+
+    def start_build(self, kind: str) -> None:
+        """Build the index of kind in a background thread, unless one is running"""
+        with self._lock:
+            if self.is_built(kind):
+                return
+            builder = self._builders.get(kind)
+            if builder is not None and builder.is_alive():
+                return
+            failed_at = self._build_failed_at.get(kind)
+            if failed_at is not None and time.monotonic() - failed_at < self.refresh_interval:
+                return
+            builder = self._builders[kind] = threading.Thread(
+                target=self._build_in_background, args=(kind,), name=f'search-build-{kind}', daemon=True
+            )
+        builder.start()
+
+    def refresh(self, session, kind: str) -> None:
+        """Pull rows written since the last refresh (e.g. by another worker)"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            entity = KINDS[kind]
+            with self._lock:
+                versions = self._versions[kind]
+                watermark = self._watermark.get(kind)
+                max_id = self._max_id.get(kind, 0)
+
+            # new rows by id, rows changed by updated_at: never the whole table
+            condition = entity.id > max_id
+            if watermark is not None:
+                condition = or_(condition, entity.updated_at >= watermark - self.LOOKBACK)
+            changed = [
+                doc_id for doc_id, updated_at in session.query(entity.id, entity.updated_at).filter(condition)
+                if versions.get(doc_id, False) != updated_at
+            ]
+
+            for start in range(0, len(changed), self.BATCH_SIZE):
+                chunk = changed[start:start + self.BATCH_SIZE]
+                rows = session.query(*self._columns(entity)).filter(entity.id.in_(chunk)).all()
+                with self._lock:
+                    for row in rows:
+                        self._apply(kind, row, versions)
+                        self._advance(kind, row[0], row[-1])
+            self._refreshed_at[kind] = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def ensure_fresh(self, session, kind: str) -> bool:
+        """Refresh the index of kind if due, False while it is not built yet"""
+        if not self.is_built(kind):
+            self.start_build(kind)
+            return False
+        if time.monotonic() - self._refreshed_at[kind] >= self.refresh_interval:
+            self.refresh(session, kind)
+        return True
+
+    def notify(self, kind: str, news) -> None:
+        """Index a News / NewsInternational object just written by this process"""
+        if not self.is_built(kind):
+            return
+        with self._lock:
+            self._apply(kind, (news.id, news.title, news.summary, news.content,
+                               news.status, news.is_deleted, news.updated_at), self._versions[kind])
+            self._advance(kind, news.id, news.updated_at)
+
+    def search(self, session, kind: str, keyword: str, limit: int = 20,
+               offset: int = 0) -> tuple[list[int], int] | None:
+        """(ids of one page, total), None while the index of kind is being built"""
+        if not self.ensure_fresh(session, kind):
+            return None
+        return self.backend.search(kind, keyword, limit, offset)
+
+    def after_fork(self) -> None:
+        """Forked child: builder threads of the parent are gone, drop what they left half built"""
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._builders = {}
+        for kind in KINDS:
+            if not self.is_built(kind):
+                self.backend.clear(kind)
+
+
+_service = None
+_configured = False
+
+
+def get_service() -> SearchService | None:
+    """Search service of this process, None if SEARCH_BACKEND is 'database' (use LIKE query)"""
+    global _service, _configured
+    if not _configured:
+        _configured = True
+        if ecf.SEARCH_BACKEND == 'memory':
+            _service = SearchService(InvertedIndex(), refresh_interval=ecf.SEARCH_REFRESH_INTERVAL)
+    return _service
+
+
+def set_backend(backend: SearchBackend | None) -> None:
+    """Plug another backend (None to fall back to LIKE query)"""
+    global _service, _configured
+    _configured = True
+    _service = SearchService(backend, refresh_interval=ecf.SEARCH_REFRESH_INTERVAL) if backend else None
+
+
+def start() -> None:
+    """Build the indexes in background at startup, searches use the LIKE query meanwhile"""
+    service = get_service()
+    if service is not None:
+        for kind in KINDS:
+            service.start_build(kind)
+
+
+def after_fork() -> None:
+    if _service is not None:
+        _service.after_fork()
+
+
+def notify(kind: str, news) -> None:
+    """Hook for model write methods"""
+    if _service is not None and news is not None:
+        _service.notify(kind, news)
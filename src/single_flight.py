@@ -0,0 +1,286 @@
+"""
+Single flight - only one caller per key recomputes a missing value
+
+Threads of a process wait for the thread computing the key and share its
+result. Processes of the same host are coordinated through SINGLE_FLIGHT_DIR,
+a folder private to the user (0700): the process that creates the lock file
+of a key (O_EXCL, one file per key) computes it, the others poll until the
+file is gone and read the result it left next to it. No lock is held while
+the value is computed, keys never wait on each other.
+
+Results are shared between processes as JSON signed with HMAC-SHA256 (key
+file of the folder), never unpickled; bytes are carried as base64, a value
+that is not JSON (e.g. an object) is only shared between the threads of its
+process. A lock file left by a process that died is taken over after
+SINGLE_FLIGHT_TIMEOUT seconds.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+from config import envConfig as ecf
+import utils
+
+
+logger = logging.getLogger(__name__)
+
+# result files older than this many timeouts are removed
+SWEEP_AFTER_TIMEOUTS = 6
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode(obj: dict):
+    if obj.keys() == {'__bytes__'}:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+class _Call:
+    """Computation of one key in progress in this process"""
+
+    __slots__ = ('done', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class SingleFlight:
+    """Coalesce concurrent computations of the same key"""
+
+    def __init__(self, lock_dir: str | None = None, timeout: float = 10):
+        self.lock_dir = lock_dir if lock_dir and utils.private_dir(lock_dir) else None
+        if lock_dir and self.lock_dir is None:
+            logger.warning('Single flight folder %s is not private, processes are not coordinated', lock_dir)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._secret = None
+        self._swept_at = 0.0
+        # statistics
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_between_processes = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, wait: bool = True):
+        """
+        Value of fn() computed once for all concurrent callers of key
+
+        Args:
+            key: hashable, its repr identifies the key between processes
+            fn: function computing the value, None means nothing to share
+                (waiting callers then compute their own value)
+            wait: False to return None at once when another caller is
+                  already computing key (stale-while-revalidate)
+
+        Returns:
+            value computed by this caller or shared by another one
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not wait:
+                return None
+            if call.done.wait(self.timeout) and call.value is not None:
+                self.coalesced += 1
+                return call.value
+            if not call.done.is_set():
+                self.timeouts += 1
+            return fn()
+
+        try:
+            call.value = self._run_shared(key, fn, wait)
+            return call.value
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _paths(self, key) -> tuple[str, str, str]:
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        base = os.path.join(self.lock_dir, f'flight-{digest[:40]}')
+        return f'{base}.lock', f'{base}.json', digest
+
+    def _run_shared(self, key, fn, wait: bool):
+        """Run fn if this process wins the lock file of key, else use the result of the winner"""
+        if self.lock_dir is None:
+            self.leaders += 1
+            return fn()
+
+        lock_path, result_path, digest = self._paths(key)
+        started = time.time()
+        if self._elect(lock_path):
+            try:
+                self.leaders += 1
+                value = fn()
+                if value is not None:
+                    self._write_result(result_path, digest, value)
+                return value
+            finally:
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                self._sweep()
+
+        if not wait:
+            return None
+        if self._wait_released(lock_path):
+            value = self._read_result(result_path, digest, started)
+            if value is not None:
+                self.shared_between_processes += 1
+                return value
+        else:
+            self.timeouts += 1
+        return fn()
+
+    def _elect(self, lock_path: str) -> bool:
+        """True if this process created the lock file (or cannot coordinate and must compute)"""
+        for _ in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+                return True
+            except FileExistsError:
+                try:
+                    age = time.time() - os.stat(lock_path).st_mtime
+                except FileNotFoundError:
+                    continue  # released meanwhile, try again
+                if age <= self.timeout:
+                    return False
+                # left by a process that died while computing
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+            except OSError:
+                logger.warning('Cannot create single flight lock in %s', self.lock_dir)
+                return True
+        return False
+
+    def _wait_released(self, lock_path: str) -> bool:
+        """Wait until the lock file is removed by its owner, False on timeout"""
+        deadline = time.monotonic() + self.timeout
+        delay = 0.002
+        while os.path.exists(lock_path):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return True
+
+    def _key(self) -> bytes:
+        """HMAC key shared by the processes of the user, created on first use"""
+        if self._secret is None:
+            path = os.path.join(self.lock_dir, 'secret.key')
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileExistsError:
+                secret = b''
+                for _ in range(50):
+                    with open(path, 'rb') as f:
+                        secret = f.read()
+                    if len(secret) == 32:
+                        break
+                    time.sleep(0.01)  # being written by another process
+                if len(secret) != 32:
+                    raise OSError(f'Invalid single flight key {path}')
+            else:
+                secret = secrets.token_bytes(32)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(secret)
+            self._secret = secret
+        return self._secret
+
+    def _read_result(self, path: str, digest: str, started: float):
+        """Result of key written by another process while this one waited, None if none or not genuine"""
+        try:
+            with open(path, 'rb') as f:
+                signature, _, payload = f.read().partition(b'\n')
+            expected = hmac.new(self._key(), payload, hashlib.sha256).hexdigest().encode('ascii')
+            if not hmac.compare_digest(signature, expected):
+                logger.warning('Single flight result %s has a wrong signature, ignored', path)
+                return None
+            stored_digest, written_at, value = json.loads(payload, object_hook=_decode)
+        except (OSError, ValueError):
+            return None
+        if stored_digest != digest or written_at < started:
+            return None
+        return value
+
+    def _write_result(self, path: str, digest: str, value) -> None:
+        try:
+            payload = json.dumps([digest, time.time(), value], separators=(',', ':'), default=_encode).encode('utf-8')
+        except (TypeError, ValueError):
+            # not JSON: only shared inside this process
+            return
+        try:
+            signature = hmac.new(self._key(), payload, hashlib.sha256).hexdigest().encode('ascii')
+            fd, temp = tempfile.mkstemp(dir=self.lock_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(signature + b'\n' + payload)
+            os.replace(temp, path)
+        except OSError:
+            logger.warning('Cannot write single flight result in %s', self.lock_dir)
+
+    def _sweep(self) -> None:
+        """Remove result files nobody will read any more, at most once per timeout"""
+        now = time.time()
+        if now - self._swept_at < self.timeout:
+            return
+        self._swept_at = now
+        try:
+            with os.scandir(self.lock_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(('.json', '.tmp')) and \
+                            now - entry.stat().st_mtime > self.timeout * SWEEP_AFTER_TIMEOUTS:
+                        os.remove(entry.path)
+        except OSError:
+            pass
+
+    def after_fork(self) -> None:
+        """Calls in flight and the lock belong to the parent process"""
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._calls),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'shared_between_processes': self.shared_between_processes,
+            'timeouts': self.timeouts,
+        }
+
+
+_flight = None
+
+
+def after_fork() -> None:
+    """Called in a forked worker, caches keep their reference to the group"""
+    if _flight is not None:
+        _flight.after_fork()
+
+
+def get_flight() -> SingleFlight:
+    """Single flight group of this process"""
+    global _flight
+    if _flight is None:
+        _flight = SingleFlight(lock_dir=ecf.SINGLE_FLIGHT_DIR, timeout=ecf.SINGLE_FLIGHT_TIMEOUT)
+    return _flight
@@ -0,0 +1,207 @@
+"""
+SQL profiler - statements and DB time of each request
+
+Enabled with SQL_PROFILER, listens to cursor events of the engines of
+database. For each request it counts statements and their time, logs
+statements slower than SQL_SLOW_QUERY_MS with the Flask endpoint, and
+reports statement shapes (SQL with parameters and IN lists collapsed)
+executed SQL_N_PLUS_ONE_THRESHOLD times or more as N+1 suspects.
+
+A request is closed at its teardown, after request_session committed and
+closed its session, so COMMIT and the flush of pending changes are
+counted. Totals per endpoint are kept in the worker and listed by
+/admin/sql-report (raw SQL: served with SQL_REPORT or to an admin); in
+debug mode each response has a header X-SQL-Queries (statements before
+the commit).
+"""
+import collections
+import logging
+import re
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from config import envConfig as ecf
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-SQL-Queries'
+
+_IN_LIST_RE = re.compile(r'\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def shape(statement: str) -> str:
+    """Statement with IN lists and numbers collapsed, same shape = same query with other values"""
+    statement = _IN_LIST_RE.sub('(?...)', statement)
+    statement = _NUMBER_RE.sub('N', statement)
+    return _SPACE_RE.sub(' ', statement).strip()
+
+
+class _EndpointTotals:
+
+    __slots__ = ('requests', 'queries', 'time', 'max_queries', 'slow', 'n_plus_one', 'suspects')
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.time = 0.0
+        self.max_queries = 0
+        self.slow = 0
+        self.n_plus_one = 0
+        # shape -> times flagged
+        self.suspects = collections.Counter()
+
+
+class Profiler:
+    """Per request statement counters and per endpoint totals of this worker"""
+
+    def __init__(self, slow_ms: float = 100, n_plus_one_threshold: int = 5, recent_slow: int = 50):
+        self.slow_ms = slow_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._endpoints = collections.defaultdict(_EndpointTotals)
+        self._slow = collections.deque(maxlen=recent_slow)
+
+    def instrument(self, engine) -> None:
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _on_error(self, context) -> None:
+        # failed statement: no after_cursor_execute, drop its start time
+        if context.connection is not None and context.cursor is not None:
+            started = context.connection.info.get('query_started')
+            if started:
+                started.pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        in_request = has_request_context()
+        endpoint = (request.endpoint or 'unmatched') if in_request else None
+
+        if elapsed * 1000 >= self.slow_ms:
+            logger.warning('Slow query %.1f ms [%s] %s', elapsed * 1000, endpoint or '-', statement)
+            with self._lock:
+                self._slow.append({'ms': round(elapsed * 1000, 1), 'endpoint': endpoint, 'statement': statement})
+                if endpoint is not None:
+                    self._endpoints[endpoint].slow += 1
+
+        if in_request:
+            stats = g.get('sql_stats')
+            if stats is None:
+                stats = g.sql_stats = {'queries': 0, 'time': 0.0, 'shapes': collections.Counter()}
+            stats['queries'] += 1
+            stats['time'] += elapsed
+            stats['shapes'][shape(statement)] += 1
+
+    def suspects(self, stats: dict) -> list[tuple[str, int]]:
+        """(shape, times) of the statements of a request repeated enough to be N+1"""
+        return [(statement, times) for statement, times in stats['shapes'].most_common()
+                if times >= self.n_plus_one_threshold]
+
+    def add_header(self, response):
+        """X-SQL-Queries of the statements run so far (debug mode)"""
+        stats = g.get('sql_stats')
+        if current_app.debug:
+            queries, seconds = (stats['queries'], stats['time']) if stats else (0, 0.0)
+            suspects = self.suspects(stats) if stats else []
+            response.headers[HEADER] = f'{queries}; time={seconds * 1000:.1f}ms; n+1={len(suspects)}'
+        return response
+
+    def finish_request(self, error=None) -> None:
+        """Add the statements of the request to totals of its endpoint"""
+        stats = g.pop('sql_stats', None)
+        endpoint = request.endpoint or 'unmatched'
+        queries, seconds = (stats['queries'], stats['time']) if stats else (0, 0.0)
+        suspects = self.suspects(stats) if stats else []
+
+        for statement, times in suspects:
+            logger.warning('N+1 suspect [%s] %d x %s', endpoint, times, statement)
+
+        with self._lock:
+            totals = self._endpoints[endpoint]
+            totals.requests += 1
+            totals.queries += queries
+            totals.time += seconds
+            totals.max_queries = max(totals.max_queries, queries)
+            if suspects:
+                totals.n_plus_one += 1
+                for statement, _ in suspects:
+                    totals.suspects[statement] += 1
+
+    def report(self) -> dict:
+        """Totals per endpoint (most DB time first) and the recent slow queries"""
+        with self._lock:
+            endpoints = [
+                {
+                    'endpoint': endpoint,
+                    'requests': totals.requests,
+                    'queries': totals.queries,
+                    'queries_per_request': round(totals.queries / totals.requests, 2) if totals.requests else 0,
+                    'max_queries': totals.max_queries,
+                    'db_time_ms': round(totals.time * 1000, 1),
+                    'db_time_per_request_ms': round(totals.time * 1000 / totals.requests, 2) if totals.requests else 0,
+                    'slow_queries': totals.slow,
+                    'n_plus_one_requests': totals.n_plus_one,
+                    'n_plus_one_suspects': [
+                        {'statement': statement, 'requests': times}
+                        for statement, times in totals.suspects.most_common(5)
+                    ],
+                }
+                for endpoint, totals in self._endpoints.items()
+            ]
+            slow = list(self._slow)
+        endpoints.sort(key=lambda row: row['db_time_ms'], reverse=True)
+        return {
+            'enabled': True,
+            'slow_query_ms': self.slow_ms,
+            'n_plus_one_threshold': self.n_plus_one_threshold,
+            'endpoints': endpoints,
+            'slow_queries': slow,
+        }
+
+
+_profiler = None
+
+
+def get_profiler() -> Profiler | None:
+    """Profiler of this worker, None when SQL_PROFILER is off"""
+    global _profiler
+    if _profiler is None and ecf.SQL_PROFILER:
+        _profiler = Profiler(ecf.SQL_SLOW_QUERY_MS, ecf.SQL_N_PLUS_ONE_THRESHOLD)
+    return _profiler
+
+
+def instrument(engine) -> None:
+    """Profile statements of engine (no-op when SQL_PROFILER is off)"""
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.instrument(engine)
+
+
+def report() -> dict:
+    profiler = get_profiler()
+    if profiler is None:
+        return {'enabled': False}
+    return profiler.report()
+
+
+def init_app(app) -> None:
+    """
+    Close the statement counters of every request
+
+    Call before request_session.init_app: teardown functions run in reverse
+    order of registration, the totals are taken after the commit.
+    """
+    profiler = get_profiler()
+    if profiler is not None:
+        app.after_request(profiler.add_header)
+        app.teardown_request(profiler.finish_request)
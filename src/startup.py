@@ -0,0 +1,44 @@
+"""
+Startup report - where the boot time of a worker goes
+
+main marks the end of each phase of create_app (imports, database,
+blueprints...); the report is logged once the app is built and served by
+/admin/startup-report.
+"""
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Durations of consecutive phases, each one ends at mark()"""
+
+    def __init__(self, started: float | None = None):
+        self.started = time.perf_counter() if started is None else started
+        self._last = self.started
+        self.phases = []
+
+    def add(self, name: str, seconds: float) -> None:
+        """Phase measured elsewhere (imports of the process)"""
+        self.phases.append((name, seconds))
+
+    def mark(self, name: str) -> None:
+        """End phase name now"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.phases)
+
+    def as_dict(self) -> dict:
+        return {
+            'total_ms': round(self.total() * 1000, 1),
+            'phases': {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+        }
+
+    def log(self) -> None:
+        logger.info('Startup %.0f ms: %s', self.total() * 1000,
+                    ', '.join(f'{name} {seconds * 1000:.0f}' for name, seconds in self.phases))
@@ -1,5 +1,10 @@
 from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
+import base64
+import json
+import os
 import re
+import stat
 
 # hash password before save into db
 def hash_password(password: str) -> str:
@@ -79,4 +84,60 @@ def _category_to_dict(category) -> dict:
         'slug': category.slug,
         'icon': category.icon,
         'parent_id': category.parent_id
-    }
\ No newline at end of file
+    }
+
+
+# encode (created_at, id) of the last row into an opaque cursor for keyset pagination,
+# created_at may be None (rows without created_at come last)
+def encode_cursor(created_at: datetime | None, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+# decode cursor into (created_at or None, id), raise ValueError if cursor is invalid
+def decode_cursor(cursor: str) -> tuple:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(created_at) if created_at is not None else None), int(row_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+# cursor of the next page, None if the current page is the last one
+def next_cursor(items: list, limit: int | None):
+    if not items or not limit or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+# create folder path readable by this user only (0700), False if it exists and
+# belongs to another user or is open to others (files in it cannot be trusted)
+def private_dir(path: str) -> bool:
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(info.st_mode):
+        return False
+    if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        return False
+    return True
+
+
+# True if process pid is running (the current one included), on Windows other
+# processes are considered gone (os.kill would terminate them)
+def pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,239 @@
+"""
+View counter - buffer view increments in process and write them in batch
+
+NewsModel.increment_view only adds to an in-memory counter. A background
+thread flushes the counter every VIEW_COUNTER_FLUSH_INTERVAL seconds with
+batched atomic `UPDATE ... SET view_count = view_count + n`, and the
+remaining increments are flushed when the process exits.
+
+Each process checkpoints its amount of unflushed increments into
+VIEW_COUNTER_STATE_DIR, a folder of the deploy private to the user (0700),
+so after a crash report_lost() tells how many increments were lost (at
+least the checkpointed amount). It runs when the app is created and when a
+worker is forked, so the crash of a worker is reported by its replacement.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import bindparam, func
+
+from config import envConfig as ecf
+import database as db
+import utils
+
+
+logger = logging.getLogger(__name__)
+
+# kind -> table of articles
+TABLES = {
+    'news': db.News.__table__,
+    'news_international': db.NewsInternational.__table__,
+}
+
+
+class ViewCounter:
+    """Aggregate view increments per article and flush them periodically"""
+
+    def __init__(self, flush_interval: float = 10, checkpoint_interval: float = 1,
+                 state_dir: str | None = None):
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.state_dir = state_dir if state_dir and utils.private_dir(state_dir) else None
+        if state_dir and self.state_dir is None:
+            logger.warning('View counter folder %s is not private, no checkpoints are written', state_dir)
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._checkpointed = 0
+        # statistics
+        self.flushed = 0
+        self.flush_errors = 0
+
+    @property
+    def state_file(self) -> str | None:
+        if not self.state_dir:
+            return None
+        return os.path.join(self.state_dir, f'views-{os.getpid()}.json')
+
+    def increment(self, kind: str, news_id: int, amount: int = 1) -> None:
+        """Count amount views of an article, written at next flush"""
+        if kind not in TABLES:
+            raise ValueError(f'Unknown kind: {kind}')
+        with self._lock:
+            self._pending[(kind, news_id)] += amount
+        if self._thread is None:
+            self.start()
+
+    def pending(self) -> int:
+        """Amount of increments not written yet"""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def start(self) -> None:
+        """Start the flush thread (started automatically on first increment)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stop the flush thread and write every pending increment"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+            self._thread = None
+        self.flush()
+        if self.state_file and self.pending() == 0:
+            try:
+                os.remove(self.state_file)
+            except FileNotFoundError:
+                pass
+        atexit.unregister(self.stop)
+
+    def after_fork(self) -> None:
+        """Forget the state copied from the parent process (its pending views, lock and thread)"""
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pending = Counter()
+        self._thread = None
+        self._checkpointed = 0
+        atexit.unregister(self.stop)
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.checkpoint_interval):
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+            else:
+                self._checkpoint()
+
+    def flush(self) -> int:
+        """
+        Write pending increments with one executemany UPDATE per table
+
+        Returns:
+            Amount of increments written
+        """
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+        if not batch:
+            return 0
+
+        session = db.get_session()
+        try:
+            for kind, table in TABLES.items():
+                params = [{'b_id': news_id, 'b_amount': amount}
+                          for (item_kind, news_id), amount in batch.items() if item_kind == kind]
+                if not params:
+                    continue
+                # keep updated_at: a view is not an edit of the article
+                statement = (
+                    table.update()
+                    .where(table.c.id == bindparam('b_id'))
+                    .values(view_count=func.coalesce(table.c.view_count, 0) + bindparam('b_amount'),
+                            updated_at=table.c.updated_at)
+                )
+                session.execute(statement, params)
+            session.commit()
+        except Exception:
+            session.rollback()
+            # keep increments for the next flush
+            with self._lock:
+                self._pending.update(batch)
+            self.flush_errors += 1
+            logger.exception('Flush view counter failed, %d increments kept for retry', sum(batch.values()))
+            return 0
+        finally:
+            session.close()
+
+        written = sum(batch.values())
+        self.flushed += written
+        self._checkpoint()
+        return written
+
+    def _checkpoint(self) -> None:
+        """Record the amount of unflushed increments of this process"""
+        state_file = self.state_file
+        if not state_file:
+            return
+        pending = self.pending()
+        if pending == self._checkpointed:
+            return
+        try:
+            tmp_file = state_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump({'pid': os.getpid(), 'pending': pending, 'at': time.time()}, f)
+            os.replace(tmp_file, state_file)
+            self._checkpointed = pending
+        except OSError:
+            logger.warning('Cannot write view counter checkpoint %s', state_file)
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending(),
+            'flushed': self.flushed,
+            'flush_errors': self.flush_errors,
+        }
+
+
+def report_lost(state_dir: str | None = None) -> int:
+    """
+    Find checkpoints left by processes that died without flushing
+
+    Returns:
+        Amount of view increments lost (lower bound)
+    """
+    state_dir = state_dir or ecf.VIEW_COUNTER_STATE_DIR
+    if not utils.private_dir(state_dir):
+        # checkpoints of another user cannot be trusted
+        return 0
+    lost = 0
+    for path in glob.glob(os.path.join(state_dir, 'views-*.json')):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if utils.pid_alive(state.get('pid', 0)):
+            continue
+        # workers starting together: the one removing the file reports it
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        lost += int(state.get('pending', 0))
+
+    if lost:
+        logger.warning('%d view increments were lost by workers that crashed before flush', lost)
+    return lost
+
+
+_counter = None
+
+
+def after_fork() -> None:
+    """Called in a forked worker, the parent keeps flushing its own views"""
+    if _counter is not None:
+        _counter.after_fork()
+
+
+def get_counter() -> ViewCounter:
+    """View counter of this process"""
+    global _counter
+    if _counter is None:
+        _counter = ViewCounter(
+            flush_interval=ecf.VIEW_COUNTER_FLUSH_INTERVAL,
+            state_dir=ecf.VIEW_COUNTER_STATE_DIR,
+        )
+    return _counter
@@ -0,0 +1,30 @@
+"""
+WSGI entry point for pre-forking servers, safe with preload (from folder src):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    uwsgi --master --processes 4 --http :8000 --module wsgi:app
+
+The app is created once in the master; its connections are closed before
+workers are forked and each worker resets the process state it inherited
+(fork_hooks), so workers share the code copy-on-write but never a socket.
+"""
+import database as db
+import fork_hooks
+import main
+
+
+fork_hooks.register()
+
+app = main.create_app()
+
+# create_app used the database (init_db): close these connections in the
+# master, workers open their own
+db.dispose_engines()
+
+try:
+    # uWSGI forks workers itself, os.register_at_fork hooks may not run there
+    from uwsgidecorators import postfork
+except ImportError:
+    pass
+else:
+    postfork(fork_hooks.after_fork_in_child)
@@ -0,0 +1,45 @@
+"""
+Tests run against a new SQLite database seeded with benchmarks.dataset
+(from the repository root: python -m pytest tests)
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+_fd, _path = tempfile.mkstemp(prefix='news_test_', suffix='.db')
+os.close(_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{_path}'
+# state files of the process stay out of the shared temp folders
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='news_test_metrics_'))
+os.environ.setdefault('VIEW_COUNTER_STATE_DIR', tempfile.mkdtemp(prefix='news_test_views_'))
+
+
+@pytest.fixture(scope='session')
+def sample():
+    """Seeded database, sample values of benchmarks.dataset.seed"""
+    import database as db
+    from benchmarks import dataset
+
+    db.init_db()
+    session = db.get_session()
+    try:
+        values = dataset.seed(session, articles=200, users=20, views=200, comments=100)
+        session.commit()
+    finally:
+        session.close()
+    return values
+
+
+@pytest.fixture
+def session(sample):
+    import database as db
+
+    session = db.get_session()
+    yield session
+    session.rollback()
+    session.close()
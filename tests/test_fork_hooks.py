@@ -0,0 +1,47 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+import database as db
+import fork_hooks
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_gets_new_pool_and_parent_keeps_its_connections(sample):
+    import main
+
+    fork_hooks.register()
+    main.create_app()
+    engine = db.create_engine_instance()
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    parent_pool = engine.pool
+    parent_connections = parent_pool.checkedin()
+    assert parent_connections
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child: report and leave without running the pytest teardown
+        status = b'error'
+        try:
+            child_pool = db.create_engine_instance().pool
+            with db.create_engine_instance().connect() as connection:
+                count = connection.execute(text('SELECT COUNT(*) FROM news')).scalar()
+            status = b'ok' if child_pool is not parent_pool and child_pool.checkedin() <= 1 and count else b'shared'
+        finally:
+            os.write(write_end, status)
+            os._exit(0)
+
+    os.close(write_end)
+    _, exit_status = os.waitpid(pid, 0)
+    with os.fdopen(read_end, 'rb') as f:
+        assert f.read() == b'ok'
+    assert os.WEXITSTATUS(exit_status) == 0
+
+    # connections of the parent were not closed by the child
+    assert engine.pool is parent_pool
+    assert parent_pool.checkedin() == parent_connections
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT COUNT(*) FROM news')).scalar()
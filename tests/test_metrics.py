@@ -0,0 +1,21 @@
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+
+
+def test_collect_drops_files_of_exited_processes(tmp_path):
+    registry = metrics.Registry(str(tmp_path))
+    registry.record('client.news', 'GET', 200, 0.01, 100)
+
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    dead_file = tmp_path / f'metrics-{exited.pid}.json'
+    dead_file.write_text(json.dumps(registry.snapshot()))
+
+    series = registry.collect()
+    assert [row['status'] for row in series] == [{'200': 1}]
+    assert not dead_file.exists()
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
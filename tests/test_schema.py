@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+from sqlalchemy import create_engine, inspect, text
+
+import database as db
+
+
+def test_add_missing_columns_adds_columns_once():
+    fd, path = tempfile.mkstemp(prefix='news_schema_', suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        db.Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE news DROP COLUMN excerpt'))
+
+        assert db.add_missing_columns(engine) == ['news.excerpt']
+        assert 'excerpt' in {column['name'] for column in inspect(engine).get_columns('news')}
+        assert db.add_missing_columns(engine) == []
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def test_init_db_alters_tables_only_when_version_changes(sample, monkeypatch):
+    def fail(engine):
+        raise AssertionError('add_missing_columns ran with an up to date schema')
+
+    assert db.stored_schema_version(db.create_engine_instance()) == db.schema_version()
+    monkeypatch.setattr(db, 'add_missing_columns', fail)
+    db.init_db(skip_ddl=False)
+    assert db.init_db(skip_ddl=True) is False
+
+
+def test_add_missing_indexes_creates_indexes_of_existing_tables():
+    fd, path = tempfile.mkstemp(prefix='news_schema_', suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        db.Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_news_updated'))
+
+        assert db.add_missing_indexes(engine) == ['ix_news_updated']
+        assert 'ix_news_updated' in {index['name'] for index in inspect(engine).get_indexes('news')}
+        assert db.add_missing_indexes(engine) == []
+    finally:
+        engine.dispose()
+        os.remove(path)
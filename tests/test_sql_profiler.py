@@ -0,0 +1,56 @@
+import flask
+import pytest
+from sqlalchemy import event
+
+import database as db
+import request_session
+import sql_profiler
+
+
+@pytest.fixture
+def profiled_app(sample, monkeypatch):
+    profiler = sql_profiler.Profiler()
+    engine = db.create_engine_instance()
+    profiler.instrument(engine)
+    monkeypatch.setattr(sql_profiler, '_profiler', profiler)
+
+    app = flask.Flask(__name__)
+    app.secret_key = 'test'
+    sql_profiler.init_app(app)
+    request_session.init_app(app)
+
+    @app.route('/write')
+    def write():
+        session = request_session.get_session()
+        session.add(db.Setting(key='sql_profiler_test', value='1', category='test'))
+        return 'ok'
+
+    yield app, profiler
+    event.remove(engine, 'before_cursor_execute', profiler._before_execute)
+    event.remove(engine, 'after_cursor_execute', profiler._after_execute)
+    event.remove(engine, 'handle_error', profiler._on_error)
+    with engine.begin() as connection:
+        connection.execute(db.Setting.__table__.delete().where(db.Setting.__table__.c.key == 'sql_profiler_test'))
+
+
+def test_commit_of_request_session_is_counted(profiled_app):
+    app, profiler = profiled_app
+    assert app.test_client().get('/write').status_code == 200
+
+    totals, = profiler.report()['endpoints']
+    # INSERT is flushed by the commit at teardown
+    assert totals['endpoint'] == 'write'
+    assert totals['requests'] == 1
+    assert totals['queries'] >= 1
+
+
+@pytest.mark.parametrize('path', ['/admin/sql-report', '/admin/cache-stats', '/admin/pool-stats',
+                                  '/admin/startup-report'])
+def test_admin_reports_are_not_public(sample, path):
+    import main
+
+    client = main.create_app().test_client()
+    assert client.get(path).status_code == 404
+    with client.session_transaction() as flask_session:
+        flask_session['role'] = db.UserRole.ADMIN.value
+    assert client.get(path).status_code == 200
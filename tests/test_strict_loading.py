@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+import config
+import model
+
+
+@pytest.fixture
+def strict_loading():
+    model.set_strict_loading(True)
+    yield
+    model.set_strict_loading(False)
+
+
+def test_lazy_load_of_card_raises(session, strict_loading):
+    news = model.NewsModel(session).get_published(limit=5)[0]
+    # card columns and the joined category are loaded
+    assert news.title and news.category.name
+    with pytest.raises(InvalidRequestError):
+        news.content
+    with pytest.raises(InvalidRequestError):
+        news.creator
+
+
+def test_lazy_load_of_card_allowed_by_default(session):
+    news = model.NewsModel(session).get_published(limit=5)[0]
+    assert news.content
+
+
+def test_create_app_reads_config_flag(sample, monkeypatch):
+    import main
+
+    monkeypatch.setattr(config.envConfig, 'DB_STRICT_LOADING', True)
+    try:
+        main.create_app()
+        assert model._strict_loading
+    finally:
+        model.set_strict_loading(False)
+    assert config.TestingConfig.DB_STRICT_LOADING
@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+import view_counter
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_report_lost_counts_checkpoints_of_dead_workers_once(tmp_path):
+    os.chmod(tmp_path, 0o700)
+    checkpoint = tmp_path / 'views-1.json'
+    checkpoint.write_text(json.dumps({'pid': _dead_pid(), 'pending': 7}))
+    (tmp_path / 'views-2.json').write_text(json.dumps({'pid': os.getpid(), 'pending': 3}))
+
+    assert view_counter.report_lost(str(tmp_path)) == 7
+    assert not checkpoint.exists()
+    assert view_counter.report_lost(str(tmp_path)) == 0
+
+
+def test_checkpoints_need_a_private_folder(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    (tmp_path / 'views-1.json').write_text(json.dumps({'pid': _dead_pid(), 'pending': 7}))
+
+    assert view_counter.report_lost(str(tmp_path)) == 0
+    assert view_counter.ViewCounter(state_dir=str(tmp_path)).state_file is None